@@ -6,6 +6,7 @@ import 'package:path/path.dart' as p;
 import 'package:http/http.dart' as http;
 
 import '../database/db_helper.dart';
+import '../database/doc_sequence.dart';
 import '../storage/attachment_storage_service.dart';
 import 'rag_document_service.dart';
 import 'vector_db_service.dart';
@@ -1794,12 +1795,7 @@ class AiToolHandler {
     final machineId = machine?['machine_id']?.toString() ?? 'GENERAL';
     final machineNo = machine?['machine_no']?.toString() ?? 'ทั่วไป';
 
-    final year = DateTime.now().year;
-    final countRow = await DbHelper.queryOne(
-      "SELECT COUNT(*) as c FROM work_orders WHERE wo_no LIKE 'WO-$year-%'",
-    );
-    final nextNum = ((countRow?['c'] as num?)?.toInt() ?? 0) + 1;
-    final woNo = 'WO-$year-${nextNum.toString().padLeft(5, '0')}';
+    final woNo = await DocSequence.next('WO');
     final woId = const Uuid().v4();
 
     final adminUser = await DbHelper.queryOne("SELECT user_id FROM users LIMIT 1");
@@ -2104,10 +2100,7 @@ class AiToolHandler {
     final requestorId = adminUser?['user_id']?.toString() ?? 'U-ADMIN';
     final requestorName = args['requester_name']?.toString().trim() ?? adminUser?['full_name']?.toString() ?? 'Admin';
 
-    final year = DateTime.now().year;
-    final countRow = await DbHelper.queryOne("SELECT COUNT(*) as c FROM work_permits WHERE permit_no LIKE 'WP-$year-%'");
-    final nextNum = ((countRow?['c'] as num?)?.toInt() ?? 0) + 1;
-    final permitNo = 'WP-$year-${nextNum.toString().padLeft(5, '0')}';
+    final permitNo = await DocSequence.next('WP');
     final permitId = const Uuid().v4();
 
     await DbHelper.execute('''
@@ -805,6 +805,7 @@ class DbInitializer {
       await _ensureFileAssetsSchema(db);
       await _ensureKnowledgeVectorsSchema(db);
       await _ensureAiChatHistorySchema(db);
+      await _ensureDocSequencesSchema(db);
       await _backfillLegacyFileAssets(db);
       await _migrateLegacyFileAssetsToManagedStorage(db);
 
@@ -1053,6 +1054,19 @@ class DbInitializer {
     );
   }
 
+  /// Counters for WO/WP/PR numbers, see DocSequence.
+  static Future<void> _ensureDocSequencesSchema(Database db) async {
+    await db.execute('''
+      CREATE TABLE IF NOT EXISTS doc_sequences (
+        prefix      TEXT NOT NULL,
+        year        INTEGER NOT NULL,
+        next_value  INTEGER NOT NULL,
+        updated_at  DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (prefix, year)
+      )
+    ''');
+  }
+
   static Future<void> _backfillLegacyFileAssets(Database db) async {
     await _backfillHandoverAttachments(db);
     await _backfillWorkOrderAttachments(db);
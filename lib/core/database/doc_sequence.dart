@@ -0,0 +1,72 @@
+import 'db_helper.dart';
+
+/// Document numbers (WO-2026-00042, WP-..., PR-...) from the `doc_sequences`
+/// counters table, one row per prefix and year.
+///
+/// Replaces `MAX(CAST(SUBSTR(wo_no, -4) AS INTEGER))` / `COUNT(*)` lookups,
+/// which scanned the table, raced between clients on the shared database and
+/// wrapped after 9999. Values are reserved in one short transaction; with
+/// [blockSize] > 1 the rest of the block is handed out from memory and any
+/// values unused when the app exits are skipped (gaps, never duplicates).
+///
+/// The counter is seeded from the highest existing number the first time a
+/// prefix/year is used. scripts/doc_sequence.py shares the same table.
+class DocSequence {
+  static const _sources = {
+    'WO': ('work_orders', 'wo_no'),
+    'WP': ('work_permits', 'permit_no'),
+    'PR': ('purchase_requests', 'pr_no'),
+  };
+
+  static final Map<String, (int, int)> _blocks = {};
+
+  /// Next number for [prefix] in the current year, e.g. `WO-2026-00042`.
+  static Future<String> next(String prefix, {int blockSize = 1}) async {
+    final year = DateTime.now().year;
+    final key = '$prefix-$year';
+    var (nextValue, end) = _blocks[key] ?? (0, 0);
+    if (nextValue >= end) {
+      nextValue = await _reserve(prefix, year, blockSize);
+      end = nextValue + blockSize;
+    }
+    _blocks[key] = (nextValue + 1, end);
+    return format(prefix, year, nextValue);
+  }
+
+  /// Five digits as before; larger values grow instead of wrapping.
+  static String format(String prefix, int year, int value) =>
+      '$prefix-$year-${value.toString().padLeft(5, '0')}';
+
+  static Future<int> _reserve(String prefix, int year, int count) {
+    final (table, column) = _sources[prefix]!;
+    final head = '$prefix-$year-';
+    return DbHelper.transaction((txn) async {
+      // GLOB can use the unique index on the number column; NOT EXISTS is
+      // constant, so the scan only runs when the counter is created.
+      await DbHelper.txExecute(txn, '''
+        INSERT OR IGNORE INTO doc_sequences (prefix, year, next_value)
+        SELECT @prefix, @year, COALESCE(MAX(CAST(SUBSTR($column, @start) AS INTEGER)), 0) + 1
+        FROM $table
+        WHERE $column GLOB @pattern
+          AND NOT EXISTS (SELECT 1 FROM doc_sequences WHERE prefix = @prefix AND year = @year)
+      ''', params: {
+        'prefix': prefix,
+        'year': year,
+        'start': head.length + 1,
+        'pattern': '$head*',
+      });
+      final row = await DbHelper.txQueryOne(
+        txn,
+        'SELECT next_value FROM doc_sequences WHERE prefix = @prefix AND year = @year',
+        params: {'prefix': prefix, 'year': year},
+      );
+      final start = (row!['next_value'] as num).toInt();
+      await DbHelper.txExecute(txn, '''
+        UPDATE doc_sequences
+        SET next_value = next_value + @count, updated_at = CURRENT_TIMESTAMP
+        WHERE prefix = @prefix AND year = @year
+      ''', params: {'count': count, 'prefix': prefix, 'year': year});
+      return start;
+    });
+  }
+}
@@ -3,6 +3,7 @@ import 'package:flutter_riverpod/flutter_riverpod.dart';
 import 'package:uuid/uuid.dart';
 
 import '../../../../core/database/db_helper.dart';
+import '../../../../core/database/doc_sequence.dart';
 import '../../../../core/theme/app_colors.dart';
 import '../../../../core/theme/app_text_styles.dart';
 import '../machine_provider.dart';
@@ -54,12 +55,11 @@ class _BulkPRDialogState extends ConsumerState<BulkPRDialog> {
     setState(() => _saving = true);
     
     try {
+      // Reserved before the insert transaction: DocSequence runs its own.
+      final prNo = await DocSequence.next('PR');
       await DbHelper.transaction((tx) async {
         final prId = const Uuid().v4();
-        // Generate a simple PR number like PR-YYYYMMDD-HHMMSS
-        final now = DateTime.now();
-        final prNo = "PR-${now.year}${now.month.toString().padLeft(2, '0')}${now.day.toString().padLeft(2, '0')}-${now.hour.toString().padLeft(2, '0')}${now.minute.toString().padLeft(2, '0')}";
-        
+
         // 1. Insert Purchase Request
         await DbHelper.txExecute(tx, '''
           INSERT INTO purchase_requests
@@ -4,6 +4,7 @@ import 'package:path/path.dart' as p;
 import 'package:flutter_riverpod/flutter_riverpod.dart';
 import 'package:uuid/uuid.dart';
 import '../../core/database/db_helper.dart';
+import '../../core/database/doc_sequence.dart';
 import '../../core/storage/attachment_storage_service.dart';
 import '../../core/auth/auth_service.dart';
 import '../../core/audit/audit_service.dart';
@@ -17,18 +18,7 @@ class WorkOrderRepository {
   static const uuid = Uuid();
 
   /// Get next work order number
-  Future<String> getNextWoNo() async {
-    try {
-      final result = await DbHelper.queryOne(
-        'SELECT MAX(CAST(SUBSTR(wo_no, -4) AS INTEGER)) as max_no FROM work_orders',
-      );
-      final maxNo = (result?['max_no'] as num?)?.toInt() ?? 0;
-      final nextNo = (maxNo + 1).toString().padLeft(5, '0');
-      return 'WO-${DateTime.now().year}-$nextNo';
-    } catch (e) {
-      return 'WO-${DateTime.now().year}-00001';
-    }
-  }
+  Future<String> getNextWoNo() => DocSequence.next('WO');
 
   /// Create new work order
   Future<String> createWorkOrder({
@@ -5,6 +5,7 @@ import '../../core/theme/app_colors.dart';
 import '../../core/theme/app_text_styles.dart';
 import '../../core/theme/app_spacing.dart';
 import '../../core/database/db_helper.dart';
+import '../../core/database/doc_sequence.dart';
 import '../../features/auth/auth_provider.dart';
 import '../../core/utils/crypto_utils.dart';
 import 'package:intl/intl.dart';
@@ -1010,6 +1011,7 @@ class _NewPermitDialogState extends ConsumerState<_NewPermitDialog> {
                     } else {
                       final id =
                           'WP-${DateTime.now().millisecondsSinceEpoch}';
+                      final permitNo = await DocSequence.next('WP');
                       await DbHelper.execute(
                         '''INSERT INTO work_permits
                            (permit_id, permit_no, permit_type, description,
@@ -1019,7 +1021,7 @@ class _NewPermitDialogState extends ConsumerState<_NewPermitDialog> {
                                    @wo, @pm, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)''',
                         params: {
                           'pid': id,
-                          'pno': 'WP-${DateTime.now().year}-${id.substring(id.length - 5)}',
+                          'pno': permitNo,
                           'type': _type.dbValue,
                           'desc': _descCtrl.text.trim(),
                           'dur': int.tryParse(_durationCtrl.text) ?? 4,
@@ -0,0 +1,268 @@
+"""Incremental, deduplicated backups of masapp.db.
+
+A consistent snapshot is taken with the sqlite3 online backup API into a
+local temp file, the image is cut into page-aligned chunks, and each chunk is
+stored once under its BLAKE2b digest (zlib-compressed). Every backup writes a
+small JSON manifest listing its chunk digests, so a nightly run only uploads
+the chunks that changed since any earlier backup.
+
+Store layout:
+    <store>/chunks/<2 hex>/<digest>.z
+    <store>/manifests/<YYYYmmdd-HHMMSS>[-N].json   (-N for a second backup in the same second)
+
+Usage:
+    python db_backup.py backup --store D:/masapp_backups
+    python db_backup.py list --store D:/masapp_backups
+    python db_backup.py restore 20261019-220000 restored.db --store D:/masapp_backups
+    python db_backup.py prune --keep 30 --store D:/masapp_backups
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import zlib
+
+db_path = r'\\No1\z\05-งานส่วนแผนก\03-MA-หน่วยงานซ่อมบำรุง(Maintenance)\Database\masapp.db'
+
+DEFAULT_STORE = 'masapp_backups'
+PAGES_PER_CHUNK = 16        # 64 KiB chunks with the default 4 KiB page size
+BACKUP_STEP_PAGES = 4096    # pages copied per backup step; lets the app keep writing
+COMPRESS_LEVEL = 6
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+class ChunkStore:
+    def __init__(self, root):
+        self.root = root
+        self.chunk_dir = os.path.join(root, 'chunks')
+        self.manifest_dir = os.path.join(root, 'manifests')
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        self._known = None
+
+    def _path(self, digest):
+        return os.path.join(self.chunk_dir, digest[:2], digest + '.z')
+
+    def known(self):
+        """Digests already in the store, listed once per run instead of stat() per chunk."""
+        if self._known is None:
+            self._known = set()
+            for sub in os.listdir(self.chunk_dir):
+                sub_path = os.path.join(self.chunk_dir, sub)
+                if os.path.isdir(sub_path):
+                    self._known.update(n[:-2] for n in os.listdir(sub_path) if n.endswith('.z'))
+        return self._known
+
+    def put(self, digest, data):
+        """Store a chunk if unseen; returns the number of compressed bytes written."""
+        if digest in self.known():
+            return 0
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        packed = zlib.compress(data, COMPRESS_LEVEL)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(packed)
+        os.replace(tmp, path)
+        self._known.add(digest)
+        return len(packed)
+
+    def get(self, digest):
+        with open(self._path(digest), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def remove(self, digest):
+        try:
+            os.remove(self._path(digest))
+        except FileNotFoundError:
+            pass
+        if self._known is not None:
+            self._known.discard(digest)
+
+    def manifests(self):
+        """Manifest names, oldest first (YYYYmmdd-HHMMSS, then its -N suffix)."""
+        names = (n[:-5] for n in os.listdir(self.manifest_dir) if n.endswith('.json'))
+        return sorted(names, key=lambda name: (name[:15], int(name[16:] or 1)))
+
+    def read_manifest(self, name):
+        with open(os.path.join(self.manifest_dir, name + '.json'), encoding='utf-8') as f:
+            return json.load(f)
+
+    def write_manifest(self, name, manifest):
+        """Write a new manifest; raises FileExistsError rather than replace one."""
+        path = os.path.join(self.manifest_dir, name + '.json')
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        try:
+            os.link(tmp, path)   # atomic and, unlike os.replace, never overwrites
+        finally:
+            os.remove(tmp)
+
+    def add_manifest(self, stamp, manifest):
+        """Store ``manifest`` as ``stamp``, or ``stamp-2``, ``-3``... if taken; returns the name."""
+        n = 1
+        while True:
+            name = stamp if n == 1 else f"{stamp}-{n}"
+            manifest['name'] = name
+            try:
+                self.write_manifest(name, manifest)
+                return name
+            except FileExistsError:
+                n += 1
+
+
+def snapshot(source_path, dest_path, step_pages=BACKUP_STEP_PAGES):
+    """Copy a consistent image of the live database with the online backup API."""
+    src = sqlite3.connect(source_path)
+    dst = sqlite3.connect(dest_path)
+    try:
+        src.backup(dst, pages=step_pages)
+        page_size = dst.execute('PRAGMA page_size').fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+    return page_size
+
+
+def backup(source_path, store, pages_per_chunk=PAGES_PER_CHUNK):
+    started = time.perf_counter()
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    fd, tmp_path = tempfile.mkstemp(suffix='.db', prefix='masapp-snapshot-')
+    os.close(fd)
+    try:
+        page_size = snapshot(source_path, tmp_path)
+        chunk_size = page_size * pages_per_chunk
+        whole = hashlib.blake2b(digest_size=20)
+        chunks = []
+        size = 0
+        new_chunks = 0
+        written = 0
+        with open(tmp_path, 'rb') as f:
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                whole.update(data)
+                size += len(data)
+                digest = _digest(data)
+                n = store.put(digest, data)
+                if n:
+                    new_chunks += 1
+                    written += n
+                chunks.append(digest)
+    finally:
+        os.remove(tmp_path)
+
+    manifest = {
+        'name': stamp,
+        'source': source_path,
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'page_size': page_size,
+        'chunk_size': chunk_size,
+        'size': size,
+        'digest': whole.hexdigest(),
+        'chunks': chunks,
+    }
+    name = store.add_manifest(stamp, manifest)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Backup {name}: {size / 1048576:.1f} MiB in {len(chunks)} chunks, "
+        f"{new_chunks} new ({written / 1048576:.2f} MiB written) in {elapsed:.1f}s."
+    )
+    return manifest
+
+
+def restore(store, name, out_path, check=True):
+    manifest = store.read_manifest(name)
+    whole = hashlib.blake2b(digest_size=20)
+    tmp = out_path + '.tmp'
+    with open(tmp, 'wb') as f:
+        for digest in manifest['chunks']:
+            data = store.get(digest)
+            if _digest(data) != digest:
+                raise ValueError(f"Chunk {digest} is corrupt")
+            whole.update(data)
+            f.write(data)
+    if whole.hexdigest() != manifest['digest']:
+        os.remove(tmp)
+        raise ValueError(f"Restored image does not match backup {name}")
+    os.replace(tmp, out_path)
+    if check:
+        conn = sqlite3.connect(out_path)
+        try:
+            result = conn.execute('PRAGMA quick_check').fetchone()[0]
+        finally:
+            conn.close()
+        if result != 'ok':
+            raise ValueError(f"quick_check failed on restored database: {result}")
+    print(f"Restored {name} to {out_path} ({manifest['size'] / 1048576:.1f} MiB).")
+
+
+def prune(store, keep):
+    """Drop all but the newest `keep` manifests and delete chunks nobody references."""
+    names = store.manifests()
+    drop = names[:-keep] if keep > 0 else names
+    for name in drop:
+        os.remove(os.path.join(store.manifest_dir, name + '.json'))
+    live = set()
+    for name in store.manifests():
+        live.update(store.read_manifest(name)['chunks'])
+    dead = store.known() - live
+    for digest in dead:
+        store.remove(digest)
+    print(f"Removed {len(drop)} backups and {len(dead)} unreferenced chunks.")
+
+
+def list_backups(store):
+    for name in store.manifests():
+        m = store.read_manifest(name)
+        print(f"{name}  {m['size'] / 1048576:9.1f} MiB  {len(m['chunks']):7d} chunks  {m['source']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Incremental chunked backups of masapp.db.')
+    parser.add_argument('--store', default=DEFAULT_STORE, help='backup store directory')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('backup', help='take a new backup')
+    p.add_argument('--db', default=db_path)
+    p.add_argument('--pages-per-chunk', type=int, default=PAGES_PER_CHUNK)
+
+    sub.add_parser('list', help='list backups in the store')
+
+    p = sub.add_parser('restore', help='reassemble a backup into a database file')
+    p.add_argument('name', help="manifest name, or 'latest'")
+    p.add_argument('out')
+    p.add_argument('--no-check', action='store_true', help='skip PRAGMA quick_check')
+
+    p = sub.add_parser('prune', help='keep the newest N backups')
+    p.add_argument('--keep', type=int, required=True)
+
+    args = parser.parse_args(argv)
+    store = ChunkStore(args.store)
+    if args.command == 'backup':
+        backup(args.db, store, args.pages_per_chunk)
+    elif args.command == 'list':
+        list_backups(store)
+    elif args.command == 'restore':
+        name = args.name
+        if name == 'latest':
+            names = store.manifests()
+            if not names:
+                raise SystemExit('No backups in store')
+            name = names[-1]
+        restore(store, name, args.out, check=not args.no_check)
+    elif args.command == 'prune':
+        prune(store, args.keep)
+
+
+if __name__ == '__main__':
+    main()
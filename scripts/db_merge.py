@@ -0,0 +1,533 @@
+"""Row-level merge of two offline copies of masapp.db.
+
+The source copy is ATTACHed to the target connection and every table is
+compared by primary-key ranges. Each range is summarised by one digest built
+from the rows' JSON-encoded column values, so identical ranges are skipped without
+pulling rows into Python. Ranges whose digests differ are bisected until they
+are small enough for a row-by-row diff, and the winning source rows are copied
+with ``INSERT ... SELECT ... ON CONFLICT DO UPDATE`` statements. All tables
+are diffed first and then applied in one transaction, so a failed merge
+leaves the target untouched.
+
+Secondary UNIQUE keys are checked during the diff: a source row whose
+unique value (work_orders.wo_no, suppliers.supplier_code, ...) belongs to a
+different target row would fail the insert. New WO/WP/PR rows whose document
+number is taken get the next free number from doc_sequences; other
+collisions keep the target row and are reported. doc_sequences itself is
+merged by taking the higher counter.
+
+Renumbered rows are recorded in the target's merge_renumbered table. Later
+merges compare those rows under their source number and write source edits
+back under the target number, so an edited row is updated in place instead
+of colliding again.
+
+Conflict rules (per table, ``--rule table=rule``):
+    newer   keep the row with the later ``updated_at`` (default)
+    source  source copy always wins
+    target  target copy always wins
+
+Rows that only exist in the target are kept; there are no tombstones, so
+deletions are never propagated.
+
+Usage:
+    python db_merge.py laptop_copy.db --target masapp.db --dry-run
+    python db_merge.py laptop_copy.db --rule app_settings=target
+"""
+import argparse
+import hashlib
+import re
+import sqlite3
+import time
+
+from doc_sequence import SOURCES as DOC_NUMBERS, allocate, format_no
+
+db_path = r'\\No1\z\05-งานส่วนแผนก\03-MA-หน่วยงานซ่อมบำรุง(Maintenance)\Database\masapp.db'
+
+RULES = ('newer', 'source', 'target')
+CHUNK_ROWS = 256        # rows per top-level range
+LEAF_ROWS = 256         # ranges at or below this size are diffed row by row
+KEYS_PER_STATEMENT = 400
+SHOW_COLLISIONS = 10
+
+# Append-only logs keyed by AUTOINCREMENT ids: both copies hand out the same
+# ids independently, so merging by key would overwrite unrelated rows.
+SKIP_TABLES = {'audit_log', 'ai_chat_history', 'usage_logs', 'user_sessions'}
+# Counters only move forward; merged by merge_counters() instead of by row.
+COUNTER_TABLE = 'doc_sequences'
+# Target-only record of renumbered rows: (table, source key) -> numbers.
+MAP_TABLE = 'merge_renumbered'
+# (table, number column) -> prefix; colliding new rows are renumbered.
+RENUMBER = {source: prefix for prefix, source in DOC_NUMBERS.items()}
+_DOC_NO = re.compile(r'^([A-Z]+)-(\d{4})-(\d+)$')
+
+
+class TablePlan:
+    def __init__(self, name, pk, columns, has_updated_at, blob_columns=(), unique_keys=()):
+        self.name = name
+        self.pk = pk
+        self.columns = columns
+        self.blob_columns = set(blob_columns)
+        self.unique_keys = list(unique_keys)
+        self.has_updated_at = has_updated_at
+        self.chunks = 0
+        self.chunks_skipped = 0
+        self.rows_compared = 0
+        self.to_insert = []
+        self.to_update = []
+        self.kept_target = 0
+        self.collisions = []    # (source key, columns, values, target key)
+        self.renumber = {}      # source key -> (column, number)
+        self.mapped = {}        # key -> (column, source number, target number) from earlier merges
+
+    @property
+    def changed(self):
+        return len(self.to_insert) + len(self.to_update) + len(self.renumber)
+
+
+def _q(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _table_info(conn, schema, table):
+    rows = conn.execute(f'PRAGMA {schema}.table_info({_q(table)})').fetchall()
+    columns = [r[1] for r in rows]
+    pk = [r[1] for r in sorted((r for r in rows if r[5]), key=lambda r: r[5])]
+    types = {r[1]: (r[2] or '').upper() for r in rows}
+    return columns, pk, types
+
+
+def _user_tables(conn, schema):
+    rows = conn.execute(
+        f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    return {r[0] for r in rows}
+
+
+def _unique_keys(conn, table):
+    """Column lists of the target's UNIQUE constraints other than the primary key."""
+    keys = []
+    for _, index, unique, origin, partial in conn.execute(f'PRAGMA main.index_list({_q(table)})'):
+        if unique and origin != 'pk' and not partial:
+            cols = [r[2] for r in conn.execute(f'PRAGMA main.index_info({_q(index)})')]
+            if cols and None not in cols:
+                keys.append(cols)
+    return keys
+
+
+def plan_tables(conn, only=None):
+    """Return a TablePlan for every table present in both copies."""
+    plans = []
+    shared = _user_tables(conn, 'main') & _user_tables(conn, 'src')
+    for table in sorted(shared):
+        if only and table not in only:
+            continue
+        if table in (COUNTER_TABLE, MAP_TABLE):
+            continue
+        if table in SKIP_TABLES and not only:
+            print(f"  skip {table}: append-only log")
+            continue
+        cols_main, pk, types = _table_info(conn, 'main', table)
+        cols_src, pk_src, _ = _table_info(conn, 'src', table)
+        if not pk or pk != pk_src:
+            print(f"  skip {table}: no common primary key")
+            continue
+        if len(pk) == 1 and types[pk[0]] == 'INTEGER':
+            print(f"  skip {table}: rowid key is not stable across copies")
+            continue
+        src_set = set(cols_src)
+        columns = [c for c in cols_main if c in src_set]
+        blobs = [c for c in columns if 'BLOB' in types[c]]
+        unique = [k for k in _unique_keys(conn, table) if set(k) <= src_set]
+        plan = TablePlan(table, pk, columns, 'updated_at' in columns, blobs, unique)
+        if MAP_TABLE in _user_tables(conn, 'main'):
+            plan.mapped = {
+                (k,): (c, old, new) for k, c, old, new in conn.execute(
+                    f'SELECT source_key, column_name, source_value, target_value FROM main.{MAP_TABLE} '
+                    'WHERE table_name = ?', (table,)
+                )
+            }
+        plans.append(plan)
+    return plans
+
+
+def ensure_map_table(conn):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS main.{MAP_TABLE} (
+            table_name    TEXT NOT NULL,
+            source_key    TEXT NOT NULL,
+            column_name   TEXT NOT NULL,
+            source_value  TEXT NOT NULL,
+            target_value  TEXT NOT NULL,
+            merged_at     DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_name, source_key)
+        )
+    ''')
+
+
+def _mapped_value(plan, column, alias, to_target):
+    """SQL for ``column`` of row ``alias`` translated through the renumber map."""
+    have, want = ('source_value', 'target_value') if to_target else ('target_value', 'source_value')
+    pk = f'{alias}{_q(plan.pk[0])}'
+    col = f'{alias}{_q(column)}'
+    return (f"COALESCE((SELECT r.{want} FROM main.{MAP_TABLE} r WHERE r.table_name = '{plan.name}' "
+            f"AND r.source_key = {pk} AND r.{have} = {col}), {col})")
+
+
+class _Range:
+    """Half-open primary-key range [lo, hi); None means unbounded."""
+
+    def __init__(self, plan, lo, hi):
+        self.plan = plan
+        self.lo = lo
+        self.hi = hi
+
+    def where(self):
+        key = '(' + ', '.join(_q(c) for c in self.plan.pk) + ')'
+        marks = '(' + ', '.join('?' for _ in self.plan.pk) + ')'
+        clauses, params = [], []
+        if self.lo is not None:
+            clauses.append(f'{key} >= {marks}')
+            params.extend(self.lo)
+        if self.hi is not None:
+            clauses.append(f'{key} < {marks}')
+            params.extend(self.hi)
+        return (' AND '.join(clauses) or '1'), params
+
+
+def _row_expr(plan, schema):
+    # json_array() builds the row signature in one C call; BLOB columns go
+    # through hex() because JSON cannot carry them. Renumbered target rows
+    # are signed under their source number so unchanged ones still match.
+    mapped = {c for c, _, _ in plan.mapped.values()} if schema == 'main' else ()
+
+    def expr(c):
+        if c in plan.blob_columns:
+            return f'hex({_q(c)})'
+        if c in mapped:
+            return _mapped_value(plan, c, f'{_q(plan.name)}.', to_target=False)
+        return _q(c)
+    return 'json_array(' + ', '.join(expr(c) for c in plan.columns) + ')'
+
+
+def _order_by(plan):
+    return ', '.join(_q(c) for c in plan.pk)
+
+
+def _digest(conn, schema, rng):
+    plan = rng.plan
+    where, params = rng.where()
+    count, joined = conn.execute(
+        f"SELECT count(*), group_concat(sig, char(30)) FROM ("
+        f"SELECT {_row_expr(plan, schema)} AS sig FROM {schema}.{_q(plan.name)} "
+        f"WHERE {where} ORDER BY {_order_by(plan)})",
+        params,
+    ).fetchone()
+    digest = hashlib.blake2b((joined or '').encode('utf-8'), digest_size=16).digest()
+    return count, digest
+
+
+def _boundaries(conn, plan, chunk_rows):
+    """Every chunk_rows-th key of the target, read from the primary-key index."""
+    cur = conn.execute(
+        f'SELECT {_order_by(plan)} FROM main.{_q(plan.name)} ORDER BY {_order_by(plan)}'
+    )
+    bounds = []
+    i = 0
+    while True:
+        batch = cur.fetchmany(chunk_rows)
+        if not batch:
+            break
+        if i:
+            bounds.append(tuple(batch[0]))
+        i += 1
+    return bounds
+
+
+def _split_key(conn, schema, rng, offset):
+    plan = rng.plan
+    where, params = rng.where()
+    row = conn.execute(
+        f'SELECT {_order_by(plan)} FROM {schema}.{_q(plan.name)} WHERE {where} '
+        f'ORDER BY {_order_by(plan)} LIMIT 1 OFFSET ?',
+        params + [offset],
+    ).fetchone()
+    return tuple(row) if row else None
+
+
+def _newer(ts_src, ts_main):
+    # Older rows mix 'YYYY-MM-DD HH:MM:SS' and ISO 'YYYY-MM-DDTHH:MM:SS'.
+    a = (ts_src or '').replace('T', ' ')
+    b = (ts_main or '').replace('T', ' ')
+    return a > b
+
+
+def _diff_rows(conn, rng, rule):
+    plan = rng.plan
+    where, params = rng.where()
+    n = len(plan.pk)
+    ts = _q('updated_at') if plan.has_updated_at else 'NULL'
+    sql = (
+        f'SELECT {_order_by(plan)}, {{sig}}, {ts} FROM {{schema}}.{_q(plan.name)} '
+        f'WHERE {where}'
+    )
+    main_rows = {tuple(r[:n]): r[n:] for r in conn.execute(
+        sql.format(sig=_row_expr(plan, 'main'), schema='main'), params)}
+    for r in conn.execute(sql.format(sig=_row_expr(plan, 'src'), schema='src'), params):
+        key = tuple(r[:n])
+        sig, updated_at = r[n:]
+        plan.rows_compared += 1
+        current = main_rows.get(key)
+        if current is None:
+            plan.to_insert.append(key)
+        elif current[0] != sig:
+            if rule == 'source' or (rule == 'newer' and _newer(updated_at, current[1])):
+                plan.to_update.append(key)
+            else:
+                plan.kept_target += 1
+
+
+def _compare_range(conn, rng, rule, leaf_rows):
+    count_main, digest_main = _digest(conn, 'main', rng)
+    count_src, digest_src = _digest(conn, 'src', rng)
+    rng.plan.chunks += 1
+    if count_main == count_src and digest_main == digest_src:
+        rng.plan.chunks_skipped += 1
+        return
+    if count_src == 0:
+        return
+    if max(count_main, count_src) <= leaf_rows:
+        _diff_rows(conn, rng, rule)
+        return
+    schema, count = ('main', count_main) if count_main >= count_src else ('src', count_src)
+    mid = _split_key(conn, schema, rng, count // 2)
+    if mid is None or mid == rng.lo:
+        _diff_rows(conn, rng, rule)
+        return
+    _compare_range(conn, _Range(rng.plan, rng.lo, mid), rule, leaf_rows)
+    _compare_range(conn, _Range(rng.plan, mid, rng.hi), rule, leaf_rows)
+
+
+def diff_table(conn, plan, rule, chunk_rows=CHUNK_ROWS, leaf_rows=LEAF_ROWS):
+    bounds = _boundaries(conn, plan, chunk_rows)
+    edges = [None] + bounds + [None]
+    for lo, hi in zip(edges, edges[1:]):
+        _compare_range(conn, _Range(plan, lo, hi), rule, leaf_rows)
+    return plan
+
+
+def _key_filter(plan, keys):
+    key = '(' + ', '.join(_q(c) for c in plan.pk) + ')'
+    row = '(' + ', '.join('?' for _ in plan.pk) + ')'
+    values = ', '.join(row for _ in keys)
+    params = [v for k in keys for v in k]
+    return f'{key} IN (VALUES {values})', params
+
+
+def find_collisions(conn, plan):
+    """Move changed rows whose unique values belong to another target row out of the plan."""
+    changed = set(plan.to_insert) | set(plan.to_update)
+    if not changed or not plan.unique_keys:
+        return
+    n = len(plan.pk)
+    src_pk = ', '.join(f's.{_q(c)}' for c in plan.pk)
+    main_pk = ', '.join(f'm.{_q(c)}' for c in plan.pk)
+    same = ' AND '.join(f'm.{_q(c)} = s.{_q(c)}' for c in plan.pk)
+    hits = {}
+    for cols in plan.unique_keys:
+        on = ' AND '.join(f'm.{_q(c)} = s.{_q(c)}' for c in cols)
+        for row in conn.execute(
+            f'SELECT {src_pk}, {main_pk}, {", ".join(f"s.{_q(c)}" for c in cols)} '
+            f'FROM src.{_q(plan.name)} s JOIN main.{_q(plan.name)} m ON {on} WHERE NOT ({same})'
+        ):
+            key = tuple(row[:n])
+            earlier = plan.mapped.get(key)
+            if earlier and cols == [earlier[0]] and row[2 * n] == earlier[1]:
+                continue    # its own source number, written back as the target number
+            if key in changed:
+                hits.setdefault(key, []).append((cols, tuple(row[2 * n:]), tuple(row[n:2 * n])))
+    if not hits:
+        return
+    inserts = set(plan.to_insert)
+    for key, found in hits.items():
+        cols = {tuple(c) for c, _, _ in found}
+        column = cols.pop()[0] if len(cols) == 1 and len(found[0][0]) == 1 else None
+        number = found[0][1][0]
+        m = _DOC_NO.match(str(number))
+        if (key in inserts and len(plan.pk) == 1 and m
+                and RENUMBER.get((plan.name, column)) == m.group(1)):
+            plan.renumber[key] = (column, number)
+        else:
+            plan.collisions.extend((key, c, v, t) for c, v, t in found)
+    plan.to_insert = [k for k in plan.to_insert if k not in hits]
+    plan.to_update = [k for k in plan.to_update if k not in hits]
+
+
+def apply_table(conn, plan):
+    """Copy the winning source rows into the target (inside the caller's transaction)."""
+    cols = ', '.join(_q(c) for c in plan.columns)
+    non_pk = [c for c in plan.columns if c not in plan.pk]
+    if non_pk:
+        conflict = 'DO UPDATE SET ' + ', '.join(f'{_q(c)} = excluded.{_q(c)}' for c in non_pk)
+    else:
+        conflict = 'DO NOTHING'
+    mapped = {c for c, _, _ in plan.mapped.values()}
+    select = ', '.join(
+        _mapped_value(plan, c, 's.', to_target=True) if c in mapped else f's.{_q(c)}' for c in plan.columns
+    )
+    keys = plan.to_insert + plan.to_update
+    for s in range(0, len(keys), KEYS_PER_STATEMENT):
+        where, params = _key_filter(plan, keys[s:s + KEYS_PER_STATEMENT])
+        conn.execute(
+            f'INSERT INTO main.{_q(plan.name)} ({cols}) '
+            f'SELECT {select} FROM src.{_q(plan.name)} s WHERE {where} '
+            f'ON CONFLICT ({_order_by(plan)}) {conflict}',
+            params,
+        )
+
+
+def apply_renumber(conn, plan):
+    """Insert new rows whose document number is taken under the next free number."""
+    pk = plan.pk[0]
+    by_counter = {}
+    for key, (column, number) in sorted(plan.renumber.items(), key=lambda kv: kv[1][1]):
+        m = _DOC_NO.match(number)
+        by_counter.setdefault((column, m.group(1), int(m.group(2))), []).append(key[0])
+    renumbered = []
+    conn.execute('DROP TABLE IF EXISTS temp.merge_renumber')
+    conn.execute('CREATE TEMP TABLE merge_renumber (k PRIMARY KEY, value TEXT NOT NULL)')
+    for (column, prefix, year), keys in by_counter.items():
+        head = f"{prefix}-{year}-"
+        # Rows merged just now may carry numbers above the counter.
+        top = conn.execute(
+            f'SELECT COALESCE(MAX(CAST(SUBSTR({_q(column)}, ?) AS INTEGER)), 0) FROM main.{_q(plan.name)} '
+            f'WHERE {_q(column)} GLOB ?', (len(head) + 1, head + '*')
+        ).fetchone()[0]
+        values = allocate(conn, prefix, year, len(keys), floor=top + 1)
+        pairs = [(k, format_no(prefix, year, v)) for k, v in zip(keys, values)]
+        conn.execute('DELETE FROM temp.merge_renumber')
+        conn.executemany('INSERT INTO temp.merge_renumber VALUES (?, ?)', pairs)
+        select = ', '.join(
+            '(SELECT value FROM temp.merge_renumber r WHERE r.k = s.' + _q(pk) + ')' if c == column
+            else f's.{_q(c)}' for c in plan.columns
+        )
+        conn.execute(
+            f'INSERT INTO main.{_q(plan.name)} ({", ".join(_q(c) for c in plan.columns)}) '
+            f'SELECT {select} FROM src.{_q(plan.name)} s WHERE s.{_q(pk)} IN (SELECT k FROM temp.merge_renumber)'
+        )
+        conn.executemany(
+            f'INSERT OR REPLACE INTO main.{MAP_TABLE} (table_name, source_key, column_name, source_value, target_value) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(plan.name, k, column, plan.renumber[(k,)][1], new) for k, new in pairs]
+        )
+        renumbered.extend((plan.renumber[(k,)][1], new) for k, new in pairs)
+    conn.execute('DROP TABLE temp.merge_renumber')
+    return renumbered
+
+
+def merge_counters(conn):
+    """Keep the higher doc_sequences counter per prefix and year."""
+    if COUNTER_TABLE not in _user_tables(conn, 'main') & _user_tables(conn, 'src'):
+        return
+    conn.execute(f'''
+        INSERT INTO main.{COUNTER_TABLE} (prefix, year, next_value, updated_at)
+        SELECT prefix, year, next_value, updated_at FROM src.{COUNTER_TABLE} WHERE 1
+        ON CONFLICT (prefix, year) DO UPDATE SET
+            next_value = max(next_value, excluded.next_value), updated_at = excluded.updated_at
+        WHERE excluded.next_value > next_value
+    ''')
+
+
+def _report(plan, rule, elapsed):
+    if plan.changed or plan.kept_target or plan.collisions:
+        print(
+            f"  {plan.name}: {plan.chunks_skipped}/{plan.chunks} ranges identical, "
+            f"{len(plan.to_insert)} new, {len(plan.to_update)} updated, "
+            f"{plan.kept_target} kept ({rule}) in {elapsed:.2f}s"
+        )
+    for key, cols, values, target in plan.collisions[:SHOW_COLLISIONS]:
+        text = ', '.join(f"{c}={v}" for c, v in zip(cols, values))
+        print(f"    {text}: source row {key} collides with target row {target}, kept target")
+    if len(plan.collisions) > SHOW_COLLISIONS:
+        print(f"    ... {len(plan.collisions) - SHOW_COLLISIONS} more collisions")
+
+
+def merge(target_path, source_path, rules=None, default_rule='newer', tables=None,
+          dry_run=False, chunk_rows=CHUNK_ROWS, leaf_rows=LEAF_ROWS):
+    rules = rules or {}
+    conn = sqlite3.connect(target_path)
+    try:
+        conn.execute('ATTACH DATABASE ? AS src', (source_path,))
+        plans = plan_tables(conn, tables)
+        for plan in plans:
+            rule = rules.get(plan.name, default_rule)
+            if rule == 'newer' and not plan.has_updated_at:
+                rule = 'target'
+            started = time.perf_counter()
+            diff_table(conn, plan, rule, chunk_rows, leaf_rows)
+            find_collisions(conn, plan)
+            _report(plan, rule, time.perf_counter() - started)
+        if dry_run:
+            for plan in plans:
+                for key, (column, number) in plan.renumber.items():
+                    print(f"  {plan.name}: {column} {number} is taken, would renumber source row {key}")
+            return plans
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for plan in plans:
+                if plan.to_insert or plan.to_update:
+                    apply_table(conn, plan)
+            if not tables or COUNTER_TABLE in tables:
+                merge_counters(conn)
+            for plan in plans:
+                if plan.renumber:
+                    ensure_map_table(conn)
+                    for old, new in apply_renumber(conn, plan):
+                        print(f"  {plan.name}: {old} is taken, inserted as {new}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return plans
+    finally:
+        conn.close()
+
+
+def _parse_rules(values):
+    rules = {}
+    for item in values or []:
+        table, _, rule = item.partition('=')
+        if rule not in RULES:
+            raise SystemExit(f"Unknown rule '{rule}' for {table}; expected one of {', '.join(RULES)}")
+        rules[table] = rule
+    return rules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Merge an offline copy of masapp.db into the shared database.')
+    parser.add_argument('source', help='copy whose changes should be merged in')
+    parser.add_argument('--target', default=db_path, help='database that receives the changes')
+    parser.add_argument('--default-rule', choices=RULES, default='newer')
+    parser.add_argument('--rule', action='append', metavar='TABLE=RULE', help='per-table conflict rule')
+    parser.add_argument('--table', action='append', help='only merge these tables')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--dry-run', action='store_true', help='report differences without writing')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    plans = merge(
+        args.target, args.source,
+        rules=_parse_rules(args.rule),
+        default_rule=args.default_rule,
+        tables=set(args.table) if args.table else None,
+        dry_run=args.dry_run,
+        chunk_rows=args.chunk_rows,
+    )
+    changed = sum(p.changed for p in plans)
+    collisions = sum(len({c[0] for c in p.collisions}) for p in plans)
+    verb = 'Would merge' if args.dry_run else 'Merged'
+    print(f"{verb} {changed} rows from {len(plans)} tables in {time.perf_counter() - started:.1f}s"
+          + (f"; {collisions} rows skipped on unique-key collisions." if collisions else '.'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+"""Batch dispatch of open work orders to technicians.
+
+Builds a technicians x work orders cost matrix with NumPy and solves it with
+the Hungarian method (scipy's linear_sum_assignment) instead of assigning
+``assigned_to`` one work order at a time. The cost combines:
+
+- skill match: technician_skills.skill_name found in the work order text or
+  the machine's category name, weighted by proficiency and certification;
+- priority: urgent/high work orders (and older ones) are cheaper to cover,
+  so they win when there are more work orders than technicians;
+- location: a technician already working on a machine at the same location
+  is cheapest, then one from the machine's department;
+- remaining hours: technician_availability.available_hours - reserved_hours
+  for the day; a work order that does not fit is infeasible.
+
+Each round assigns at most one work order per technician, deducts the hours
+and repeats until nothing fits. Proposed assignments are printed; --write
+stores them (assigned_to and reserved_hours) in one transaction.
+
+Usage:
+    python dispatch.py                       # propose for today
+    python dispatch.py --date 2026-10-20 --write
+    python dispatch.py bench                 # synthetic 500 x 50 timing
+"""
+import argparse
+import datetime
+import time
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from session import Session, db_path
+
+DEFAULT_HOURS = 2.0         # work orders without estimated_hours
+DAY_HOURS = 8.0             # technicians without an availability row
+OPEN_STATUSES = ('pending', 'approved')
+IN_PROGRESS = 'in_progress'   # WorkOrderStatus.inProgress.dbValue (work_order_models.dart)
+PRIORITY = {'low': 0.0, 'normal': 1.0, 'high': 2.0, 'urgent': 3.0}
+PROFICIENCY = {'basic': 0.5, 'intermediate': 0.75, 'expert': 1.0}
+WEIGHTS = {'skill': 4.0, 'priority': 2.0, 'age': 0.5, 'location': 1.0, 'load': 1.0}
+INFEASIBLE = 1e6
+
+
+def load_technicians(conn, day):
+    rows = conn.execute('''
+        SELECT u.user_id, u.full_name, u.dept_id,
+               COALESCE(a.available_hours, ?) - COALESCE(a.reserved_hours, 0)
+        FROM users u
+        LEFT JOIN technician_availability a
+               ON a.technician_id = u.user_id AND a.available_date = ?
+        WHERE u.role = 'technician' AND u.is_active = 1
+        ORDER BY u.user_id
+    ''', (DAY_HOURS, day)).fetchall()
+    techs = [{'user_id': r[0], 'name': r[1], 'dept_id': r[2], 'hours': max(r[3] or 0.0, 0.0)} for r in rows]
+    skills = {}
+    for tech_id, name, level, certified in conn.execute(
+        'SELECT technician_id, skill_name, proficiency_level, certified FROM technician_skills'
+    ):
+        weight = PROFICIENCY.get(level or 'intermediate', 0.75) + (0.25 if certified else 0.0)
+        key = (name or '').strip().lower()
+        if key:
+            skills.setdefault(tech_id, {})[key] = max(weight, skills.get(tech_id, {}).get(key, 0.0))
+    # Locations the technician is already working at (in-progress work orders).
+    busy = {}
+    for tech_id, machine_id in conn.execute(
+        'SELECT assigned_to, machine_id FROM work_orders WHERE status = ? AND assigned_to IS NOT NULL', (IN_PROGRESS,)
+    ):
+        busy.setdefault(tech_id, set()).add(machine_id)
+    for t in techs:
+        t['skills'] = skills.get(t['user_id'], {})
+        t['machines'] = busy.get(t['user_id'], set())
+    return techs
+
+
+def load_work_orders(conn, statuses=OPEN_STATUSES):
+    marks = ','.join('?' * len(statuses))
+    cur = conn.execute(f'''
+        SELECT wo_id, wo_no, machine_id, priority, title, description, failure_symptom,
+               estimated_hours, created_at
+        FROM work_orders
+        WHERE status IN ({marks}) AND (assigned_to IS NULL OR assigned_to = '')
+        ORDER BY created_at
+    ''', statuses)
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+
+def cost_matrix(techs, wos, machine_by_id, today):
+    """Technicians x work orders cost, plus the hours each work order needs."""
+    T, W = len(techs), len(wos)
+    vocab = sorted({s for t in techs for s in t['skills']})
+    index = {s: k for k, s in enumerate(vocab)}
+    proficiency = np.zeros((T, len(vocab)))
+    for i, t in enumerate(techs):
+        for s, w in t['skills'].items():
+            proficiency[i, index[s]] = w
+
+    machines = [machine_by_id(wo['machine_id']) or {} for wo in wos]
+    texts = [
+        ' '.join(filter(None, (wo['title'], wo['description'], wo['failure_symptom'],
+                               m.get('category_name'), m.get('machine_name')))).lower()
+        for wo, m in zip(wos, machines)
+    ]
+    mentions = np.array([[s in text for s in vocab] for text in texts], dtype=float).reshape(W, len(vocab))
+    # Best matching skill per pair; 0 when no skill is mentioned at all.
+    skill = (proficiency[:, None, :] * mentions[None, :, :]).max(axis=2, initial=0.0)
+    needs_skill = mentions.any(axis=1)
+    skill_cost = np.where(needs_skill[None, :], 1.0 - np.minimum(skill, 1.0), 0.5)
+
+    priority = np.array([PRIORITY.get(wo['priority'] or 'normal', 1.0) for wo in wos]) / 3.0
+    age = np.array([_age_days(wo['created_at'], today) for wo in wos])
+    urgency = WEIGHTS['priority'] * priority + WEIGHTS['age'] * np.minimum(age, 14.0) / 14.0
+
+    wo_dept = np.array([m.get('dept_id') or '' for m in machines], dtype=object)
+    wo_location = [m.get('location') for m in machines]
+    location = np.ones((T, W))
+    for i, t in enumerate(techs):
+        if t['dept_id']:
+            location[i, wo_dept == t['dept_id']] = 0.5
+        here = {(machine_by_id(mid) or {}).get('location') for mid in t['machines']} - {None}
+        if here:
+            location[i, [loc in here for loc in wo_location]] = 0.0
+
+    hours = np.array([wo['estimated_hours'] or DEFAULT_HOURS for wo in wos], dtype=float)
+    cost = (WEIGHTS['skill'] * skill_cost + WEIGHTS['location'] * location - urgency[None, :])
+    return cost, hours
+
+
+def _age_days(created_at, today):
+    try:
+        return max((today - datetime.datetime.fromisoformat(str(created_at)[:19])).days, 0)
+    except ValueError:
+        return 0.0
+
+
+def assign(cost, hours, capacity):
+    """Repeated Hungarian rounds; returns [(tech index, wo index)]."""
+    capacity = np.asarray(capacity, dtype=float).copy()
+    open_wo = np.ones(cost.shape[1], dtype=bool)
+    result = []
+    while open_wo.any():
+        cols = np.nonzero(open_wo)[0]
+        fits = capacity[:, None] >= hours[None, cols]
+        rows = np.nonzero(fits.any(axis=1))[0]
+        if not len(rows):
+            break
+        # Busier technicians cost more, which spreads the work.
+        load = WEIGHTS['load'] * (1.0 - capacity[rows] / max(capacity.max(), 1e-9))
+        sub = cost[np.ix_(rows, cols)] + load[:, None]
+        sub = np.where(fits[rows], sub, INFEASIBLE)
+        r, c = linear_sum_assignment(sub)
+        ok = sub[r, c] < INFEASIBLE
+        if not ok.any():
+            break
+        for ti, wi in zip(rows[r[ok]], cols[c[ok]]):
+            result.append((int(ti), int(wi)))
+            capacity[ti] -= hours[wi]
+            open_wo[wi] = False
+    return result
+
+
+def dispatch(session, day=None, statuses=OPEN_STATUSES):
+    day = day or datetime.date.today().isoformat()
+    conn = session.conn
+    techs = load_technicians(conn, day)
+    wos = load_work_orders(conn, statuses)
+    if not techs or not wos:
+        return techs, wos, [], np.zeros(0)
+    cost, hours = cost_matrix(techs, wos, session.machine_by_id, datetime.datetime.now())
+    pairs = assign(cost, hours, [t['hours'] for t in techs])
+    return techs, wos, pairs, hours
+
+
+def write_assignments(conn, techs, wos, pairs, hours, day):
+    now = datetime.datetime.now().isoformat()
+    reserved = {}
+    for ti, wi in pairs:
+        reserved[techs[ti]['user_id']] = reserved.get(techs[ti]['user_id'], 0.0) + float(hours[wi])
+    with conn:
+        cur = conn.executemany('''
+            UPDATE work_orders SET assigned_to = ?, updated_at = ?
+            WHERE wo_id = ? AND (assigned_to IS NULL OR assigned_to = '')
+        ''', [(techs[ti]['user_id'], now, wos[wi]['wo_id']) for ti, wi in pairs])
+        updated = cur.rowcount
+        conn.executemany('''
+            INSERT INTO technician_availability (avail_id, technician_id, available_date, available_hours, reserved_hours)
+            VALUES (lower(hex(randomblob(16))), ?, ?, ?, ?)
+            ON CONFLICT(technician_id, available_date)
+            DO UPDATE SET reserved_hours = COALESCE(reserved_hours, 0) + excluded.reserved_hours
+        ''', [(tech_id, day, DAY_HOURS, h) for tech_id, h in reserved.items()])
+    return updated
+
+
+def bench(n_wo=500, n_tech=50, n_skills=30, seed=0):
+    rng = np.random.default_rng(seed)
+    cost = rng.uniform(0, 5, size=(n_tech, n_wo)) - rng.uniform(0, 2, size=n_wo)[None, :]
+    hours = rng.choice([0.5, 1.0, 2.0, 4.0], size=n_wo)
+    capacity = rng.choice([4.0, 6.0, 8.0], size=n_tech)
+    started = time.perf_counter()
+    pairs = assign(cost, hours, capacity)
+    elapsed = time.perf_counter() - started
+    print(f"{n_wo} work orders x {n_tech} technicians: {len(pairs)} assigned in {elapsed * 1000:.1f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Assign open work orders to technicians in one batch.')
+    parser.add_argument('--db', default=db_path)
+    parser.add_argument('command', nargs='?', choices=['propose', 'bench'], default='propose')
+    parser.add_argument('--date', help='availability date (default today)')
+    parser.add_argument('--status', nargs='+', default=list(OPEN_STATUSES))
+    parser.add_argument('--write', action='store_true', help='save assignments')
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        return bench()
+
+    day = args.date or datetime.date.today().isoformat()
+    with Session(args.db) as session:
+        started = time.perf_counter()
+        techs, wos, pairs, hours = dispatch(session, day, tuple(args.status))
+        elapsed = time.perf_counter() - started
+        for ti, wi in sorted(pairs, key=lambda p: (techs[p[0]]['name'], wos[p[1]]['wo_no'])):
+            wo = wos[wi]
+            print(f"{wo['wo_no']}  [{wo['priority']}] {hours[wi]:.1f}h -> {techs[ti]['name']}")
+        print(
+            f"{len(pairs)} of {len(wos)} work orders assigned to {len({p[0] for p in pairs})} "
+            f"of {len(techs)} technicians in {elapsed * 1000:.0f}ms"
+        )
+        if args.write and pairs:
+            updated = write_assignments(session.conn, techs, wos, pairs, hours, day)
+            print(f"Saved {updated} assignments.")
+
+
+if __name__ == '__main__':
+    main()
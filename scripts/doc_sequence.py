@@ -0,0 +1,128 @@
+"""Document number allocator backed by the doc_sequences counters table.
+
+Numbers such as WO-2026-00042 used to be derived from
+``MAX(CAST(SUBSTR(wo_no, -4) AS INTEGER))``, which scans work_orders on every
+insert, races between two clients, and wraps after 9999 because only four of
+the five digits are read. Instead one row per (prefix, year) holds the next
+free value. A caller reserves a block of numbers in one short write
+transaction and hands them out from memory; unused numbers in a block are
+simply skipped (gaps are allowed, duplicates are not).
+
+The counter is seeded from the highest existing number the first time a
+prefix/year is used, so it continues existing sequences. The app
+(lib/core/database/doc_sequence.dart) uses the same table.
+
+Usage:
+    python doc_sequence.py                 # show counters
+    python doc_sequence.py WO --take 3     # reserve and print three WO numbers
+"""
+import datetime
+
+BLOCK = 50
+
+# prefix -> (table, number column) used to seed a new counter
+SOURCES = {
+    'WO': ('work_orders', 'wo_no'),
+    'WP': ('work_permits', 'permit_no'),
+    'PR': ('purchase_requests', 'pr_no'),
+}
+
+
+def ensure_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS doc_sequences (
+            prefix      TEXT NOT NULL,
+            year        INTEGER NOT NULL,
+            next_value  INTEGER NOT NULL,
+            updated_at  DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (prefix, year)
+        )
+    ''')
+
+
+def format_no(prefix, year, value):
+    # Five digits as before; larger values simply grow instead of wrapping.
+    return f"{prefix}-{year}-{value:05d}"
+
+
+def allocate(conn, prefix, year, count, floor=1):
+    """Take ``count`` consecutive values inside the caller's transaction.
+
+    ``floor`` raises the counter first, for callers that have just written
+    numbers the counter has not seen (db_merge.py).
+    """
+    table, column = SOURCES[prefix]
+    head = f"{prefix}-{year}-"
+    ensure_table(conn)
+    # GLOB (unlike LIKE) can use the unique index on the number column;
+    # the NOT EXISTS is constant, so the scan only runs for a new counter.
+    conn.execute(f'''
+        INSERT OR IGNORE INTO doc_sequences (prefix, year, next_value)
+        SELECT ?, ?, COALESCE(MAX(CAST(SUBSTR({column}, ?) AS INTEGER)), 0) + 1
+        FROM {table}
+        WHERE {column} GLOB ?
+          AND NOT EXISTS (SELECT 1 FROM doc_sequences WHERE prefix = ? AND year = ?)
+    ''', (prefix, year, len(head) + 1, head + '*', prefix, year))
+    start = conn.execute('''
+        UPDATE doc_sequences
+        SET next_value = max(next_value, ?) + ?, updated_at = CURRENT_TIMESTAMP
+        WHERE prefix = ? AND year = ?
+        RETURNING next_value - ?
+    ''', (floor, count, prefix, year, count)).fetchone()[0]
+    return range(start, start + count)
+
+
+def reserve(conn, prefix, year, count):
+    """Reserve ``count`` consecutive values and return them as a range.
+
+    Commits immediately so the block is visible to other clients.
+    """
+    with conn:
+        return allocate(conn, prefix, year, count)
+
+
+class DocSequence:
+    """Hands out numbers for one prefix, reserving ``block`` at a time."""
+
+    def __init__(self, conn, prefix, year=None, block=BLOCK):
+        self.conn = conn
+        self.prefix = prefix
+        self.year = year or datetime.date.today().year
+        self.block = block
+        self._free = iter(())
+
+    def next(self):
+        value = next(self._free, None)
+        if value is None:
+            self._free = iter(reserve(self.conn, self.prefix, self.year, self.block))
+            value = next(self._free)
+        return format_no(self.prefix, self.year, value)
+
+
+def main(argv=None):
+    import argparse
+    from session import Session, db_path
+
+    parser = argparse.ArgumentParser(description='Show or reserve document number counters.')
+    parser.add_argument('--db', default=db_path)
+    parser.add_argument('prefix', nargs='?', choices=list(SOURCES))
+    parser.add_argument('--year', type=int)
+    parser.add_argument('--take', type=int, default=1, help='numbers to reserve and print')
+    args = parser.parse_args(argv)
+
+    with Session(args.db) as session:
+        conn = session.conn
+        if not args.prefix:
+            ensure_table(conn)
+            for prefix, year, next_value, updated_at in conn.execute(
+                'SELECT prefix, year, next_value, updated_at FROM doc_sequences ORDER BY prefix, year'
+            ):
+                print(f"{prefix}-{year}: next {next_value} (updated {updated_at})")
+            return
+        seq = DocSequence(conn, args.prefix, args.year, block=args.take)
+        for _ in range(args.take):
+            print(seq.next())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,355 @@
+"""Component-level failure analytics for PM planning.
+
+The legacy log names the failing part only in free text ("เครื่องพิมพ์ 6 สี
+ตู้ 7 มีเสียงดัง เปลี่ยนลูกปืนใหม่"). This job extracts (machine, unit,
+component) failure events from work orders and fits a Weibull distribution
+to the time between failures of every tuple:
+
+- machine: work_orders.machine_id, else the legacy machine keywords
+  (fix_legacy_wo.machine_map) and the registry;
+- unit: "ตู้ 4", "ตู้ 2+7", "ตู้ 2,3,4,5" (printer units) and the feeder;
+  '' when the text names no unit;
+- component: keywords in COMPONENTS, most specific first.
+
+Events live in component_failures (one row per work order, unit and
+component); like machine_events the refresh is incremental (incremental.py),
+so only new or edited work orders are re-extracted and only the tuples they
+touch are re-fitted. ``--full`` rebuilds everything
+(needed after fix_legacy_wo.py, which backdates updated_at) and also
+refreshes the censored interval of tuples without new failures.
+
+Reports of the same failure within MERGE_DAYS count once. Shape (beta) and
+scale (eta, days) are maximum-likelihood estimates with the time since the
+last failure as a right-censored interval. All tuples are solved together:
+Newton's method on the profile likelihood, with per-tuple sums from
+np.bincount. component_reliability stores the fit with MTBF, the B10 life
+(interval with 90% survival, a PM interval candidate) and the date it falls
+due after the last failure.
+
+Usage:
+    python failure_analytics.py              # incremental refresh and refit
+    python failure_analytics.py --full
+    python failure_analytics.py --show 30    # worst components first
+"""
+import argparse
+import re
+import time
+
+import numpy as np
+from scipy.special import gamma
+
+from fix_legacy_wo import get_machine_id
+from incremental import changed, ensure_state, last_refresh, record
+from rowstream import BATCH, WorkOrder, scan
+from session import Session, db_path
+
+MERGE_DAYS = 1.0        # reports of one failure within a day count once
+REPEAT_DAYS = 30.0      # a failure this soon after the previous one is a repeat
+MIN_FAILURES = 3        # failure intervals needed for a Weibull fit
+RELIABILITY = 0.9       # B10 life
+SKIP_STATUSES = ('cancelled', 'rejected')
+STATE = 'component_failure_state'
+
+# component -> keywords, most specific first: a matched keyword is removed
+# from the text, so "มีดปาดสี" is not also counted as "ใบมีด".
+COMPONENTS = [
+    ('มีดปาดสี', ['มีดปาดสี', 'doctor blade']),
+    ('ลูกปืน', ['ลูกปืน', 'bearing']),
+    ('สายพาน', ['สายพาน', 'belt']),
+    ('ปั๊ม', ['ปั๊ม', 'ป๊ัม', 'ปั้ม', 'pump']),
+    ('เพลา', ['เพลา', 'shaft']),
+    ('ลูกกลิ้ง', ['ลูกกลิ้ง', 'roller']),
+    ('อนิล็อกซ์', ['anilox', 'อนิ๊ลอ', 'อนิล็อ']),
+    ('กระบอกลม', ['กระบอกลม', 'cylinder']),
+    ('สายลม', ['สายลม', 'ลมรั่ว', 'ข้อต่อลม']),
+    ('ไฮดรอลิก', ['ไฮโดรลิค', 'ไฮดรอลิก', 'hydrolic', 'hydraulic']),
+    ('เบรก', ['เบรก', 'เบรค', 'brake']),
+    ('โช๊ค', ['โช๊ค', 'โช้ค', 'shock']),
+    ('แมกเนติก', ['แมกเนติก', 'magnetic']),
+    ('มอเตอร์', ['มอเตอ', 'motor']),
+    ('หลอดไฟ', ['หลอดไฟ', 'lamp']),
+    ('ใบมีด', ['ใบมีด', 'มีด', 'blade']),
+]
+UNIT = re.compile(r'ตู้\s*(?:roller\s*)?(\d+(?:\s*[+,]\s*\d+)*)', re.IGNORECASE)
+
+
+def extract(text):
+    """(units, components) named in a work order text."""
+    low = text.lower()
+    components = []
+    for name, words in COMPONENTS:
+        hit = False
+        for word in words:
+            if word in low:
+                low = low.replace(word, ' ')
+                hit = True
+        if hit:
+            components.append(name)
+    units = {u for m in UNIT.finditer(text) for u in re.split(r'\s*[+,]\s*', m.group(1))}
+    if 'ตู้ฟีด' in text:
+        units.add('ฟีด')
+    return sorted(units) or [''], components
+
+
+def ensure_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS component_failures (
+            wo_id       TEXT NOT NULL,
+            machine_id  TEXT NOT NULL,
+            unit        TEXT NOT NULL DEFAULT '',
+            component   TEXT NOT NULL,
+            failed_at   TEXT NOT NULL,
+            PRIMARY KEY (wo_id, unit, component)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_component_failures_tuple
+        ON component_failures(machine_id, unit, component, failed_at)
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS component_reliability (
+            machine_id       TEXT NOT NULL,
+            unit             TEXT NOT NULL DEFAULT '',
+            component        TEXT NOT NULL,
+            failures         INTEGER NOT NULL,
+            repeat_failures  INTEGER NOT NULL,
+            first_failure    TEXT,
+            last_failure     TEXT,
+            mean_tbf_days    REAL,
+            beta             REAL,
+            eta_days         REAL,
+            mtbf_days        REAL,
+            b10_days         REAL,
+            next_due         TEXT,
+            fitted_at        DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (machine_id, unit, component)
+        )
+    ''')
+    ensure_state(conn, STATE)
+
+
+def refresh_failures(conn, registry, full=False):
+    """Re-extract changed work orders into component_failures.
+
+    Returns the number of work orders read; the tuples to re-fit are left
+    in temp.refit_tuples.
+    """
+    conn.execute('DROP TABLE IF EXISTS temp.refit_tuples')
+    conn.execute('CREATE TEMP TABLE refit_tuples (machine_id TEXT, unit TEXT, component TEXT, '
+                 'PRIMARY KEY (machine_id, unit, component))')
+    conn.execute('DROP TABLE IF EXISTS temp.changed_wo')
+    conn.execute('CREATE TEMP TABLE changed_wo (wo_id TEXT PRIMARY KEY)')
+    conn.execute('DROP TABLE IF EXISTS temp.new_failures')
+    conn.execute('CREATE TEMP TABLE new_failures AS SELECT * FROM component_failures WHERE 0')
+
+    last = (0, '') if full else last_refresh(conn, STATE, 'work_orders')
+    where, params = changed(last, ['updated_at'])
+
+    read = 0
+    ids, events = [], []
+
+    def flush():
+        conn.executemany('INSERT OR IGNORE INTO changed_wo VALUES (?)', ((i,) for i in ids))
+        conn.executemany('INSERT OR IGNORE INTO new_failures VALUES (?,?,?,?,?)', events)
+        ids.clear()
+        events.clear()
+
+    for wo in scan(conn, WorkOrder, where, params):
+        read += 1
+        ids.append(wo.wo_id)
+        if wo.status in SKIP_STATUSES or not wo.created_at:
+            continue
+        text = ' '.join(filter(None, (wo.title, wo.description, wo.failure_symptom)))
+        units, components = extract(text)
+        if not components:
+            continue
+        machine_id = wo.machine_id if wo.machine_id and wo.machine_id != 'GENERAL' else get_machine_id(registry, text)[0]
+        if not machine_id:
+            continue
+        failed_at = wo.created_at.replace('T', ' ')[:19]
+        events.extend((wo.wo_id, machine_id, u, c, failed_at) for u in units for c in components)
+        if len(ids) >= BATCH:
+            flush()
+    flush()
+
+    if full:
+        conn.execute('DELETE FROM component_failures')
+    # Tuples touched by edited, new and deleted work orders.
+    conn.execute('''
+        INSERT OR IGNORE INTO refit_tuples
+        SELECT machine_id, unit, component FROM component_failures
+        WHERE wo_id IN (SELECT wo_id FROM changed_wo)
+           OR NOT EXISTS (SELECT 1 FROM work_orders w WHERE w.wo_id = component_failures.wo_id)
+    ''')
+    conn.execute('''
+        DELETE FROM component_failures
+        WHERE wo_id IN (SELECT wo_id FROM changed_wo)
+           OR NOT EXISTS (SELECT 1 FROM work_orders w WHERE w.wo_id = component_failures.wo_id)
+    ''')
+    conn.execute('INSERT OR IGNORE INTO refit_tuples SELECT DISTINCT machine_id, unit, component FROM new_failures')
+    conn.execute('INSERT INTO component_failures SELECT * FROM new_failures')
+    conn.execute('DROP TABLE temp.new_failures')
+    conn.execute('DROP TABLE temp.changed_wo')
+    record(conn, STATE, 'work_orders', 'work_orders', last)
+    return read
+
+
+def fit_weibull(t, group, failed, n, iterations=50):
+    """Weibull (beta, eta) per group from intervals ``t`` > 0, some right-censored.
+
+    Solves the profile-likelihood equation for beta with Newton's method for
+    every group at once; eta follows in closed form. Groups with fewer than
+    MIN_FAILURES failures, or identical failure times only, get NaN.
+    """
+    failed = failed.astype(float)
+    r = np.bincount(group, failed, minlength=n)
+    # Intervals relative to each group's longest keep t**beta in range.
+    scale = np.zeros(n)
+    np.maximum.at(scale, group, t)
+    lu = np.log(t / scale[group])
+    mean_log = np.divide(np.bincount(group, failed * lu, minlength=n), r, out=np.zeros(n), where=r > 0)
+    spread = np.bincount(group, failed * (lu - mean_log[group]) ** 2, minlength=n)
+    ok = (r >= MIN_FAILURES) & (spread > 1e-12)
+
+    beta = np.ones(n)
+    for _ in range(iterations):
+        uk = np.exp(beta[group] * lu)
+        s0 = np.bincount(group, uk, minlength=n)
+        s1 = np.bincount(group, uk * lu, minlength=n)
+        s2 = np.bincount(group, uk * lu * lu, minlength=n)
+        f = 1.0 / beta + mean_log - s1 / s0
+        df = -1.0 / beta ** 2 - (s2 * s0 - s1 ** 2) / s0 ** 2
+        new = np.clip(beta - f / df, beta / 2, beta * 2).clip(0.05, 20.0)
+        done = np.abs(new - beta)[ok].max(initial=0.0) < 1e-9
+        beta = new
+        if done:
+            break
+    s0 = np.bincount(group, np.exp(beta[group] * lu), minlength=n)
+    eta = scale * np.divide(s0, r, out=np.ones(n), where=r > 0) ** (1.0 / beta)
+    return np.where(ok, beta, np.nan), np.where(ok, eta, np.nan)
+
+
+def refit(conn, full=False):
+    """Fit every tuple in temp.refit_tuples (all tuples when full); returns the count stored."""
+    where = '' if full else 'WHERE (machine_id, unit, component) IN (SELECT machine_id, unit, component FROM refit_tuples)'
+    rows = conn.execute(f'''
+        SELECT machine_id, unit, component, julianday(failed_at), failed_at FROM component_failures
+        {where}
+        ORDER BY machine_id, unit, component, failed_at
+    ''').fetchall()
+    now = conn.execute("SELECT julianday('now', 'localtime')").fetchone()[0]
+    if full:
+        conn.execute('DELETE FROM component_reliability')
+    else:
+        conn.execute(f'DELETE FROM component_reliability {where}')
+    rows = [r for r in rows if r[3] is not None]
+    if not rows:
+        return 0
+
+    keys = [r[:3] for r in rows]
+    days = np.array([r[3] for r in rows])
+    new_key = np.ones(len(rows), dtype=bool)
+    new_key[1:] = [a != b for a, b in zip(keys[1:], keys[:-1])]
+    # Drop repeat reports of one failure.
+    keep = new_key.copy()
+    keep[1:] |= np.diff(days) >= MERGE_DAYS
+    days, new_key = days[keep], new_key[keep]
+    stamps = [rows[i][4] for i in np.nonzero(keep)[0]]
+    tuples = [keys[i] for i in np.nonzero(keep)[0][new_key]]
+
+    group = np.cumsum(new_key) - 1
+    n = len(tuples)
+    first = np.nonzero(new_key)[0]
+    last = np.append(first[1:], len(days)) - 1
+    failures = np.bincount(group, minlength=n)
+
+    gaps = np.diff(days)
+    inner = ~new_key[1:]
+    tbf, tbf_group = gaps[inner], group[1:][inner]
+    censored = now - days[last]
+    live = censored > 0
+    t = np.concatenate([tbf, censored[live]])
+    g = np.concatenate([tbf_group, np.nonzero(live)[0]])
+    failed = np.concatenate([np.ones(len(tbf), dtype=bool), np.zeros(live.sum(), dtype=bool)])
+    beta, eta = fit_weibull(t, g, failed, n)
+
+    intervals = np.bincount(tbf_group, minlength=n)
+    mean_tbf = np.divide(np.bincount(tbf_group, tbf, minlength=n), intervals,
+                         out=np.full(n, np.nan), where=intervals > 0)
+    repeats = np.bincount(tbf_group, tbf < REPEAT_DAYS, minlength=n).astype(int)
+    mtbf = eta * gamma(1.0 + 1.0 / beta)
+    b10 = eta * (-np.log(RELIABILITY)) ** (1.0 / beta)
+
+    def num(x):
+        return None if np.isnan(x) else round(float(x), 4)
+
+    conn.executemany('''
+        INSERT INTO component_reliability (
+            machine_id, unit, component, failures, repeat_failures, first_failure, last_failure,
+            mean_tbf_days, beta, eta_days, mtbf_days, b10_days, next_due
+        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?, date(julianday(?) + ?))
+    ''', [
+        (*tuples[i], int(failures[i]), int(repeats[i]), stamps[first[i]], stamps[last[i]],
+         num(mean_tbf[i]), num(beta[i]), num(eta[i]), num(mtbf[i]), num(b10[i]),
+         stamps[last[i]], num(b10[i]))
+        for i in range(n)
+    ])
+    return n
+
+
+def refresh(session, full=False):
+    conn = session.conn
+    registry = session.registry
+    ensure_tables(conn)
+    conn.commit()
+    # BEGIN IMMEDIATE so no writer slips in between reading the changes and storing the watermark.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        read = refresh_failures(conn, registry, full)
+        fitted = refit(conn, full)
+        conn.execute('DROP TABLE temp.refit_tuples')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return read, fitted
+
+
+def report(session, limit=20):
+    """Fitted tuples, most repeat failures and shortest B10 life first."""
+    rows = session.conn.execute('''
+        SELECT machine_id, unit, component, failures, repeat_failures, beta, eta_days, b10_days, next_due
+        FROM component_reliability
+        ORDER BY repeat_failures DESC, b10_days IS NULL, b10_days, failures DESC
+        LIMIT ?
+    ''', (limit,)).fetchall()
+    for machine_id, unit, component, failures, repeats, beta, eta, b10, due in rows:
+        m = session.machine_by_id(machine_id)
+        name = f"{m['machine_no'] if m else machine_id}{' ตู้ ' + unit if unit else ''} {component}"
+        fit = f"beta {beta:.2f}, eta {eta:.0f}d, B10 {b10:.0f}d, due {due}" if beta is not None else 'too few failures'
+        print(f"  {name}: {failures} failures ({repeats} repeats) {fit}")
+
+
+def run(session, full=False, show=10):
+    started = time.perf_counter()
+    read, fitted = refresh(session, full)
+    total, fits = session.conn.execute('SELECT count(*), count(beta) FROM component_reliability').fetchone()
+    print(f"Read {read} work orders, re-fitted {fitted} components in {time.perf_counter() - started:.2f}s "
+          f"({total} tracked, {fits} with a Weibull fit)")
+    if show:
+        report(session, show)
+    return fitted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Extract component failures and fit Weibull reliability.')
+    parser.add_argument('--db', default=db_path)
+    parser.add_argument('--full', action='store_true', help='re-extract and re-fit everything')
+    parser.add_argument('--show', type=int, default=10, help='components to list')
+    args = parser.parse_args(argv)
+    with Session(args.db) as session:
+        run(session, args.full, args.show)
+
+
+if __name__ == '__main__':
+    main()
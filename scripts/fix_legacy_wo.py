@@ -1,14 +1,5 @@
-import sqlite3
-import json
-import re
-
-db_path = r'\\No1\z\05-งานส่วนแผนก\03-MA-หน่วยงานซ่อมบำรุง(Maintenance)\Database\masapp.db'
-conn = sqlite3.connect(db_path)
-cur = conn.cursor()
-
-# Get all machines for mapping
-with open('machines.json', encoding='utf-8') as f:
-    machines = json.load(f)
+from rowstream import UpdateSink, WorkOrder, changed, scan
+from session import Session
 
 # Common mappings based on observation
 machine_map = {
@@ -41,18 +32,17 @@ machine_map = {
 }
 
 # Resolve machine ID
-def get_machine_id(title):
+def get_machine_id(registry, title):
     for key, no in machine_map.items():
         if no and key in title:
-            # Find ID
-            for m in machines:
-                if m['no'] == no:
-                    return m['id'], m['name']
+            m = registry.machine(no)
+            if m:
+                return m['machine_id'], m['machine_name']
     
     # Fallback to general lookup
-    for m in machines:
-        if m['name'] in title or m['no'] in title:
-            return m['id'], m['name']
+    m = registry.match_text(title)
+    if m:
+        return m['machine_id'], m['machine_name']
             
     return None, None
 
@@ -71,49 +61,44 @@ def fix_date(date_str):
         
     return f"{year:04d}-{date_parts[1]}-{date_parts[2]} {parts[1]}"
 
-# Get all legacy work orders
-cur.execute("SELECT wo_no, title, created_at, completed_at FROM work_orders WHERE wo_no LIKE 'WO-2026-%'")
-rows = cur.fetchall()
-
-updated_count = 0
+def fix_record(registry, wo):
+    """Fix Buddhist-era dates and map the colloquial machine name; True if changed."""
+    new_created = fix_date(wo.created_at)
+    new_completed = fix_date(wo.completed_at)
 
-for row in rows:
-    wo_no = row[0]
-    title = row[1]
-    created_at = row[2]
-    completed_at = row[3]
-    
-    new_created = fix_date(created_at)
-    new_completed = fix_date(completed_at)
-    
     # Machine mapping
-    m_id, m_name = get_machine_id(title)
-    
+    m_id, m_name = get_machine_id(registry, wo.title)
+
     # If mapped, replace colloquial name with official name in title
-    new_title = title
+    new_title = wo.title
     if m_name:
         for key in machine_map.keys():
             if key in new_title:
                 new_title = new_title.replace(key, f"{m_name}")
                 break
-    
+
     # Only update if there are changes
-    if new_created != created_at or new_completed != completed_at or m_id or new_title != title:
-        if m_id:
-            cur.execute("""
-                UPDATE work_orders
-                SET created_at = ?, completed_at = ?, updated_at = ?, started_at = ?, machine_id = ?, title = ?
-                WHERE wo_no = ?
-            """, (new_created, new_completed, new_completed, new_created, m_id, new_title, wo_no))
-        else:
-            cur.execute("""
-                UPDATE work_orders
-                SET created_at = ?, completed_at = ?, updated_at = ?, started_at = ?
-                WHERE wo_no = ?
-            """, (new_created, new_completed, new_completed, new_created, wo_no))
-        updated_count += 1
+    if new_created == wo.created_at and new_completed == wo.completed_at and not m_id:
+        return False
+    values = {'created_at': new_created, 'completed_at': new_completed,
+              'updated_at': new_completed, 'started_at': new_created}
+    if m_id:
+        values.update(machine_id=m_id, title=new_title)
+    return wo.update(values)
+
+def run(session):
+    conn = session.conn
+    registry = session.registry
+
+    # All legacy work orders, streamed
+    records = scan(conn, WorkOrder, "wo_no LIKE 'WO-2026-%'")
+    sink = UpdateSink(conn, WorkOrder, ['created_at', 'completed_at', 'updated_at', 'started_at', 'machine_id', 'title'])
+    updated_count = sink.write(changed(records, lambda wo: fix_record(registry, wo)))
+
+    print(f"Updated {updated_count} work orders successfully.")
+    return updated_count
 
-conn.commit()
-conn.close()
 
-print(f"Updated {updated_count} work orders successfully.")
+if __name__ == '__main__':
+    with Session() as session:
+        run(session)
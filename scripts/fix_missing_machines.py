@@ -1,48 +1,19 @@
-import sqlite3
-import uuid
 import datetime
 
-db_path = r'\\No1\z\05-งานส่วนแผนก\03-MA-หน่วยงานซ่อมบำรุง(Maintenance)\Database\masapp.db'
-conn = sqlite3.connect(db_path)
-cur = conn.cursor()
+from session import Session
 
-def fetch_machine(no):
-    cur.execute("SELECT * FROM machines WHERE machine_no = ?", (no,))
-    m = cur.fetchone()
-    if m:
-        cols = [description[0] for description in cur.description]
-        return dict(zip(cols, m))
-    return None
-
-def update_wo_machine(wo_no, machine_no):
-    m = fetch_machine(machine_no)
+def update_wo_machine(session, wo_no, machine_no):
+    m = session.machine(machine_no)
     if not m:
         return False
     
     m_id = m['machine_id']
-    
-    # Check if snapshot exists
-    cur.execute("SELECT snapshot_id FROM machine_snapshots WHERE machine_id = ? ORDER BY captured_at DESC LIMIT 1", (m_id,))
-    snap = cur.fetchone()
-    
-    s_id = None
-    if snap:
-        s_id = snap[0]
-    else:
-        s_id = str(uuid.uuid4())
-        now = datetime.datetime.now().isoformat()
-        cur.execute('''
-            INSERT INTO machine_snapshots (
-                snapshot_id, machine_id, machine_no, machine_name, brand, model,
-                dept_name, location, captured_at
-            ) VALUES (?,?,?,?,?,?,?,?,?)
-        ''', (
-            s_id, m_id, m.get('machine_no'), m.get('machine_name'),
-            m.get('brand'), m.get('model'), m.get('department'),
-            m.get('location'), now
-        ))
+    s_id = session.ensure_snapshot(m)
         
-    cur.execute("UPDATE work_orders SET machine_id = ?, snapshot_id = ? WHERE wo_no = ?", (m_id, s_id, wo_no))
+    session.conn.execute(
+        "UPDATE work_orders SET machine_id = ?, snapshot_id = ?, updated_at = ? WHERE wo_no = ?",
+        (m_id, s_id, datetime.datetime.now().isoformat(), wo_no)
+    )
     return True
 
 # Fix mappings
@@ -54,15 +25,6 @@ fixes = {
     'WO-2026-00259': 'PT-04', # จัมโบ้
 }
 
-updated = 0
-for wo, m_no in fixes.items():
-    if update_wo_machine(wo, m_no):
-        updated += 1
-
-# Also scan ALL WOs and fix any other missing ones based on keywords
-cur.execute("SELECT wo_no, title FROM work_orders WHERE snapshot_id IS NULL OR snapshot_id = ''")
-wos = cur.fetchall()
-
 keyword_map = {
     'ปะกาวGM07': 'GM-07',
     'ปะกาวGM02': 'GM-02',
@@ -95,28 +57,45 @@ keyword_map = {
     'แฮนลิฟท์': 'FG25S', # fallback
 }
 
-for wo in wos:
-    wo_no, title = wo
-    if wo_no in fixes: continue # already did
+def run(session):
+    cur = session.cursor()
+
+    updated = 0
+    for wo, m_no in fixes.items():
+        if update_wo_machine(session, wo, m_no):
+            updated += 1
+
+    # Also scan ALL WOs and fix any other missing ones based on keywords
+    cur.execute("SELECT wo_no, title FROM work_orders WHERE snapshot_id IS NULL OR snapshot_id = ''")
+    wos = cur.fetchall()
+
+    for wo in wos:
+        wo_no, title = wo
+        if wo_no in fixes: continue # already did
     
-    for kw, m_no in keyword_map.items():
-        if kw in title:
-            if update_wo_machine(wo_no, m_no):
+        for kw, m_no in keyword_map.items():
+            if kw in title:
+                if update_wo_machine(session, wo_no, m_no):
+                    updated += 1
+                break
+
+    # Fix previous mistakes where I mapped slot machines to SC (เย็บลวด)
+    cur.execute("SELECT wo_no, title FROM work_orders WHERE machine_id IN (SELECT machine_id FROM machines WHERE machine_no IN ('SC-01', 'SC-02', 'SC-03'))")
+    wos_sc = cur.fetchall()
+    for wo in wos_sc:
+        wo_no, title = wo
+        if 'สล็อต' in title:
+            m_no = 'ST-03'
+            if 'ไส้1' in title or 'ไส้ 1' in title: m_no = 'ST-01'
+            if 'ไส้2' in title or 'ไส้ 2' in title: m_no = 'ST-02'
+            if update_wo_machine(session, wo_no, m_no):
                 updated += 1
-            break
 
-# Fix previous mistakes where I mapped slot machines to SC (เย็บลวด)
-cur.execute("SELECT wo_no, title FROM work_orders WHERE machine_id IN (SELECT machine_id FROM machines WHERE machine_no IN ('SC-01', 'SC-02', 'SC-03'))")
-wos_sc = cur.fetchall()
-for wo in wos_sc:
-    wo_no, title = wo
-    if 'สล็อต' in title:
-        m_no = 'ST-03'
-        if 'ไส้1' in title or 'ไส้ 1' in title: m_no = 'ST-01'
-        if 'ไส้2' in title or 'ไส้ 2' in title: m_no = 'ST-02'
-        if update_wo_machine(wo_no, m_no):
-            updated += 1
+    session.commit()
+    print(f"Updated {updated} missing/wrong machine mappings.")
+    return updated
+
 
-conn.commit()
-conn.close()
-print(f"Updated {updated} missing/wrong machine mappings.")
+if __name__ == '__main__':
+    with Session() as session:
+        run(session)
@@ -1,8 +1,5 @@
-import sqlite3
-
-db_path = r'\\No1\z\05-งานส่วนแผนก\03-MA-หน่วยงานซ่อมบำรุง(Maintenance)\Database\masapp.db'
-conn = sqlite3.connect(db_path)
-cur = conn.cursor()
+from rowstream import Supplier, UpdateSink, changed, scan
+from session import Session
 
 replacements = {
     'จาํ กดั': 'จํากัด',
@@ -123,33 +120,29 @@ replacements = {
     'บางกระดี': 'บางกระดี่',
 }
 
-cur.execute("SELECT supplier_id, name, contact_name, address, service_scope FROM suppliers")
-rows = cur.fetchall()
+FIELDS = ['name', 'contact_name', 'address', 'service_scope']
+
+
+def fix_text(supplier):
+    """Apply the OCR replacements to the text fields; True if any changed."""
+    values = {}
+    for field in FIELDS:
+        text = getattr(supplier, field)
+        if text:
+            for k, v in replacements.items():
+                text = text.replace(k, v)
+        values[field] = text
+    return supplier.update(values)
+
 
-updated = 0
-for row in rows:
-    s_id, name, contact, address, scope = row
-    
-    new_name = name if name else ""
-    new_contact = contact if contact else ""
-    new_address = address if address else ""
-    new_scope = scope if scope else ""
-    
-    for k, v in replacements.items():
-        new_name = new_name.replace(k, v)
-        new_contact = new_contact.replace(k, v)
-        new_address = new_address.replace(k, v)
-        new_scope = new_scope.replace(k, v)
-        
-    if new_name != name or new_contact != contact or new_address != address or new_scope != scope:
-        cur.execute('''
-            UPDATE suppliers 
-            SET name = ?, contact_name = ?, address = ?, service_scope = ? 
-            WHERE supplier_id = ?
-        ''', (new_name, new_contact, new_address, new_scope, s_id))
-        updated += 1
+def run(session):
+    conn = session.conn
+    sink = UpdateSink(conn, Supplier, FIELDS)
+    updated = sink.write(changed(scan(conn, Supplier), fix_text))
+    print(f"Fixed {updated} suppliers.")
+    return updated
 
-conn.commit()
-conn.close()
 
-print(f"Fixed {updated} suppliers.")
+if __name__ == '__main__':
+    with Session() as session:
+        run(session)
@@ -1,20 +1,9 @@
-import sqlite3
 import uuid
 import re
 from datetime import datetime
-import traceback
 
-db_path = r'\\No1\z\05-งานส่วนแผนก\03-MA-หน่วยงานซ่อมบำรุง(Maintenance)\Database\masapp.db'
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
-
-try:
-    cursor.execute("SELECT MAX(CAST(SUBSTR(wo_no, -4) AS INTEGER)) FROM work_orders")
-    row = cursor.fetchone()
-    max_no = row[0] if row and row[0] is not None else 0
-except Exception as e:
-    max_no = 0
-    print(f"Failed to get max_no: {e}")
+from doc_sequence import DocSequence
+from session import Session
 
 data = """24/2/66 เครื่องพิมพ์ 6 สี ป๊ัมดูดสีตู้ 6 ดับเอง เปลี่ยนป๊ัมสีใหม่ ช่างบอล 27/2/23 ทำระหว่างล้างAnilox ปั๊ม
 1/3/66 เครื่องพิมพ์ 6 สี ตู้ 4 ลูกปืนวันเวย์ไม่ดี เปลี่ยนลูกปืนใหม่ ช่างบอล 2/3/23 เปลี่ยนลิ่มใหม่ ลูกปืน
@@ -295,46 +284,55 @@ def parse_date(date_str):
         pass
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-success_count = 0
-for line in data.split('\n'):
-    line = line.strip()
-    if not line: continue
+def run(session):
+    cursor = session.cursor()
+    lines = [line.strip() for line in data.split('\n') if line.strip()]
+    # One reservation for the whole log instead of a MAX() scan per run.
+    wo_numbers = DocSequence(session.conn, 'WO', block=len(lines))
+
+    success_count = 0
+    wo_no = None
+    for line in lines:
     
-    match = re.match(r'^(\d{1,2}/\d{1,2}/\d{2,4})\s+(.*)$', line)
-    if not match:
-        continue
+        match = re.match(r'^(\d{1,2}/\d{1,2}/\d{2,4})\s+(.*)$', line)
+        if not match:
+            continue
     
-    date_str = match.group(1)
-    rest = match.group(2)
+        date_str = match.group(1)
+        rest = match.group(2)
     
-    created_at = parse_date(date_str)
+        created_at = parse_date(date_str)
     
-    completed_at = created_at
-    comp_match = re.search(r'(\d{1,2}/\d{1,2}/\d{2,4})', rest)
-    if comp_match:
-        completed_at = parse_date(comp_match.group(1))
+        completed_at = created_at
+        comp_match = re.search(r'(\d{1,2}/\d{1,2}/\d{2,4})', rest)
+        if comp_match:
+            completed_at = parse_date(comp_match.group(1))
     
-    max_no += 1
-    wo_no = f"WO-2026-{max_no:05d}"
-    wo_id = str(uuid.uuid4())
+        wo_no = wo_numbers.next()
+        wo_id = str(uuid.uuid4())
     
-    title = rest[:100]
-    description = rest
+        title = rest[:100]
+        description = rest
     
-    try:
-        cursor.execute('''
-            INSERT INTO work_orders (
-                wo_id, wo_no, status, priority, title, description,
-                started_at, completed_at, created_by, created_at, updated_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            wo_id, wo_no, 'completed', 'normal', title, description,
-            created_at, completed_at, 'system', created_at, completed_at
-        ))
-        success_count += 1
-    except Exception as e:
-        print(f"Error inserting {wo_no}: {e}")
+        try:
+            cursor.execute('''
+                INSERT INTO work_orders (
+                    wo_id, wo_no, status, priority, title, description,
+                    started_at, completed_at, created_by, created_at, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                wo_id, wo_no, 'completed', 'normal', title, description,
+                created_at, completed_at, 'system', created_at, completed_at
+            ))
+            success_count += 1
+        except Exception as e:
+            print(f"Error inserting {wo_no}: {e}")
+
+    session.commit()
+    print(f"Inserted {success_count} records successfully! Last wo_no: {wo_no}")
+    return success_count
+
 
-conn.commit()
-conn.close()
-print(f"Inserted {success_count} records successfully! Final max_no: {max_no}")
+if __name__ == '__main__':
+    with Session() as session:
+        run(session)
@@ -0,0 +1,362 @@
+"""Import running-hours / OEE sheets into machine_running_hours.
+
+The in-app OEE Excel import loads a whole workbook into memory and inserts
+row by row. This importer streams workbooks with openpyxl's read-only mode,
+so memory stays flat however many monthly sheets a department sends:
+
+- columns are detected from the header row with the same patterns as
+  oee_excel_import_dialog.dart (machine, date, hours, target/actual/good),
+  plus an optional daily-hours column;
+- machine numbers/names resolve through the cached MachineRegistry;
+- rows are staged in a temp table keyed by (machine_id, recorded_date), so a
+  repeated row keeps the last value;
+- cumulative hours are checked per machine with NumPy against the running
+  maximum, starting from the last reading already in the database, and
+  against the lowest stored reading on a later day; rows that go backwards
+  are rejected (listed) unless --allow-decrease is given;
+- daily_hours is derived from consecutive cumulative readings when the sheet
+  has no daily column;
+- the staged rows are upserted on (machine_id, day) in one transaction, so
+  re-importing a sheet updates instead of duplicating.
+
+Usage:
+    python import_running_hours.py 2026/*.xlsx
+    python import_running_hours.py oee_jan.xlsx --sheet Sheet1 --dry-run
+"""
+import argparse
+import datetime
+import glob
+import re
+import time
+import uuid
+
+import numpy as np
+
+from session import Session, db_path
+
+BATCH = 5000
+
+# Header patterns, same as oee_excel_import_dialog.dart; daily is matched first
+# so a "daily hours" column is not taken as the cumulative one.
+COLUMNS = {
+    'machine': [r'machine', r'mc', r'm/c', r'เครื่อง', r'รหัสเครื่อง', r'line'],
+    'date': [r'date', r'วันที่', r'วัน', r'^time$'],
+    'daily': [r'daily', r'ต่อวัน', r'รายวัน'],
+    'hours': [r'cumulative', r'สะสม', r'hour', r'hrs', r'hr', r'ชม', r'ชั่วโมง', r'uptime', r'run'],
+    'target': [r'target', r'plan', r'เป้า', r'เป้าหมาย', r'ยอดเป้า'],
+    'actual': [r'actual', r'output', r'ผลิตได้', r'ยอดจริง', r'ยอดผลิต'],
+    'good': [r'good', r'ok', r'ของดี', r'งานดี', r'pass'],
+}
+OEE_COLUMNS = {'target': 'target_production', 'actual': 'actual_production', 'good': 'good_production'}
+_EXCEL_EPOCH = datetime.datetime(1899, 12, 30)
+
+
+def detect_columns(headers):
+    headers = [str(h or '').strip().lower() for h in headers]
+    found = {}
+    for name, patterns in COLUMNS.items():
+        for i, h in enumerate(headers):
+            if i in found.values():
+                continue
+            if any(re.search(p, h) for p in patterns):
+                found[name] = i
+                break
+    return found
+
+
+def parse_date(value):
+    """Date as 'YYYY-MM-DD' from a datetime, Excel serial or d/m/y text (BE years allowed)."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, (int, float)):
+        return (_EXCEL_EPOCH + datetime.timedelta(days=float(value))).date().isoformat()
+    s = str(value).strip()
+    try:
+        return datetime.date.fromisoformat(s[:10]).isoformat()
+    except ValueError:
+        pass
+    parts = re.split(r'[/.-]', s.split()[0])
+    if len(parts) == 3 and all(p.isdigit() for p in parts):
+        d, m, y = (int(p) for p in parts)
+        if y < 100:
+            y += 2500 if y > 50 else 2000
+        if y > 2400:
+            y -= 543
+        try:
+            return datetime.date(y, m, d).isoformat()
+        except ValueError:
+            return None
+    return None
+
+
+def parse_number(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(',', '').strip())
+    except ValueError:
+        return None
+
+
+def read_rows(path, sheet=None):
+    """Yield (sheet, row number, column map, values) from a workbook without loading it."""
+    import openpyxl
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            if sheet and ws.title != sheet:
+                continue
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None)
+            if not header:
+                continue
+            columns = detect_columns(header)
+            if 'machine' not in columns or 'hours' not in columns:
+                print(f"  {path} [{ws.title}]: no machine/hours columns, skipped")
+                continue
+            for n, values in enumerate(rows, start=2):
+                yield ws.title, n, columns, values
+    finally:
+        wb.close()
+
+
+def _stage_table(conn):
+    conn.execute('DROP TABLE IF EXISTS temp.hours_stage')
+    conn.execute('''
+        CREATE TEMP TABLE hours_stage (
+            machine_id        TEXT NOT NULL,
+            recorded_date     TEXT NOT NULL,
+            cumulative_hours  REAL NOT NULL,
+            daily_hours       REAL,
+            target_production REAL,
+            actual_production REAL,
+            good_production   REAL,
+            PRIMARY KEY (machine_id, recorded_date)
+        )
+    ''')
+
+
+def stage(session, paths, sheet=None):
+    """Stream every row into temp.hours_stage; returns (rows read, unresolved machine counts)."""
+    conn = session.conn
+    registry = session.registry
+    resolved = {}
+    unresolved = {}
+    batch = []
+    read = 0
+
+    def flush():
+        conn.executemany('INSERT OR REPLACE INTO hours_stage VALUES (?,?,?,?,?,?,?)', batch)
+        batch.clear()
+
+    for path in paths:
+        for _, _, cols, values in read_rows(path, sheet):
+            def cell(name):
+                i = cols.get(name)
+                return values[i] if i is not None and i < len(values) else None
+
+            raw = str(cell('machine') or '').strip()
+            hours = parse_number(cell('hours'))
+            day = parse_date(cell('date'))
+            if not raw or hours is None or not day:
+                continue
+            read += 1
+            if raw not in resolved:
+                m = registry.find(raw) or registry.find(raw.upper())
+                resolved[raw] = m['machine_id'] if m else None
+            machine_id = resolved[raw]
+            if not machine_id:
+                unresolved[raw] = unresolved.get(raw, 0) + 1
+                continue
+            batch.append((
+                machine_id, day, hours, parse_number(cell('daily')),
+                parse_number(cell('target')), parse_number(cell('actual')), parse_number(cell('good')),
+            ))
+            if len(batch) >= BATCH:
+                flush()
+    if batch:
+        flush()
+    return read, unresolved
+
+
+def _day_index(conn):
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_machine_running_hours_day
+        ON machine_running_hours(machine_id, substr(recorded_date, 1, 10))
+    ''')
+
+
+def check_monotonic(conn, allow_decrease=False):
+    """Reject staged readings out of order with the machine's other readings; fill missing daily hours.
+
+    A reading is out of order when it is below the running maximum before it
+    or above a stored reading on a later day that the import does not replace.
+    Returns the rejected (machine_id, recorded_date, cumulative, limit) rows.
+    """
+    _day_index(conn)
+    # Staged rows in order, each with the lowest stored reading after it
+    # (window over staged and kept stored rows of the machine).
+    staged = conn.execute('''
+        WITH first AS (SELECT machine_id, min(recorded_date) AS day FROM hours_stage GROUP BY machine_id),
+        merged AS (
+            SELECT machine_id, recorded_date AS day, cumulative_hours, daily_hours IS NULL AS no_daily,
+                   NULL AS stored
+            FROM hours_stage
+            UNION ALL
+            SELECT h.machine_id, substr(h.recorded_date, 1, 10), NULL, NULL, h.cumulative_hours
+            FROM machine_running_hours h
+            JOIN first f ON f.machine_id = h.machine_id AND substr(h.recorded_date, 1, 10) > f.day
+            WHERE NOT EXISTS (
+                SELECT 1 FROM hours_stage t
+                WHERE t.machine_id = h.machine_id AND t.recorded_date = substr(h.recorded_date, 1, 10)
+            )
+        )
+        SELECT machine_id, day, cumulative_hours, no_daily, ceiling FROM (
+            SELECT *, min(stored) OVER (
+                PARTITION BY machine_id ORDER BY day ROWS BETWEEN 1 FOLLOWING AND UNBOUNDED FOLLOWING
+            ) AS ceiling
+            FROM merged
+        )
+        WHERE stored IS NULL
+        ORDER BY machine_id, day
+    ''').fetchall()
+    if not staged:
+        return []
+    # Last reading already stored before each machine's first staged day.
+    previous = dict(
+        (r[0], r[1]) for r in conn.execute('''
+            SELECT s.machine_id, (
+                SELECT h.cumulative_hours FROM machine_running_hours h
+                WHERE h.machine_id = s.machine_id AND substr(h.recorded_date, 1, 10) < s.first_day
+                ORDER BY substr(h.recorded_date, 1, 10) DESC LIMIT 1
+            )
+            FROM (SELECT machine_id, min(recorded_date) AS first_day FROM hours_stage GROUP BY machine_id) s
+        ''')
+    )
+    machines = np.array([r[0] for r in staged], dtype=object)
+    cum = np.array([r[2] for r in staged], dtype=float)
+    new_machine = np.ones(len(staged), dtype=bool)
+    new_machine[1:] = machines[1:] != machines[:-1]
+    segment = np.cumsum(new_machine) - 1
+    starts = np.nonzero(new_machine)[0]
+    base = np.array([previous.get(machines[i]) for i in starts], dtype=float)   # NaN when none
+    base = np.where(np.isnan(base), -np.inf, base)
+    ceiling = np.array([r[4] for r in staged], dtype=float)
+    high = cum > np.where(np.isnan(ceiling), np.inf, ceiling)
+
+    # Running maximum per machine: lift each machine's values above the previous
+    # machine's so one maximum.accumulate never carries across machines. Readings
+    # above a later stored one are left out so a spike does not reject the rest.
+    known = base[np.isfinite(base)]
+    lo = min(cum.min(), known.min(initial=np.inf))
+    offset = segment * (max(cum.max(), known.max(initial=-np.inf)) - lo + 1)
+    running = np.maximum.accumulate(np.where(high, -np.inf, cum - lo + offset)) - offset + lo
+    prior = np.empty_like(cum)
+    prior[1:] = running[:-1]
+    prior[starts] = -np.inf
+    prior = np.maximum(prior, base[segment])
+    bad = (cum < prior) | high
+
+    # Daily hours from the previous accepted reading where the sheet had none.
+    prev_value = np.where(np.isfinite(prior), prior, np.nan)
+    derived = cum - prev_value
+    need_daily = np.array([r[3] for r in staged], dtype=bool) & np.isfinite(derived) & ~bad
+    conn.executemany(
+        'UPDATE hours_stage SET daily_hours = ? WHERE machine_id = ? AND recorded_date = ?',
+        [(float(derived[i]), staged[i][0], staged[i][1]) for i in np.nonzero(need_daily)[0]]
+    )
+
+    limit = np.where(high, ceiling, prior)
+    rejected = [(staged[i][0], staged[i][1], float(cum[i]), float(limit[i])) for i in np.nonzero(bad)[0]]
+    if rejected and not allow_decrease:
+        conn.executemany(
+            'DELETE FROM hours_stage WHERE machine_id = ? AND recorded_date = ?',
+            [(r[0], r[1]) for r in rejected]
+        )
+    return rejected
+
+
+def upsert(conn):
+    """Update existing (machine, day) readings and insert the rest; returns (updated, inserted)."""
+    columns = {r[1] for r in conn.execute('PRAGMA table_info(machine_running_hours)')}
+    oee = [c for c in OEE_COLUMNS.values() if c in columns]
+    _day_index(conn)
+    sets = ', '.join(f"{c} = COALESCE(s.{c}, machine_running_hours.{c})" for c in ['daily_hours'] + oee)
+    updated = conn.execute(f'''
+        UPDATE machine_running_hours
+        SET cumulative_hours = s.cumulative_hours, {sets}
+        FROM hours_stage s
+        WHERE machine_running_hours.machine_id = s.machine_id
+          AND substr(machine_running_hours.recorded_date, 1, 10) = s.recorded_date
+    ''').rowcount
+    extra = ['data_source'] if 'data_source' in columns else []
+    insert_cols = ['hours_id', 'machine_id', 'cumulative_hours', 'daily_hours', 'recorded_date'] + oee + extra
+    select_cols = ['?', 's.machine_id', 's.cumulative_hours', 's.daily_hours', 's.recorded_date'] + \
+        [f's.{c}' for c in oee] + ["'excel_import'"] * len(extra)
+    new = conn.execute('''
+        SELECT s.machine_id, s.recorded_date FROM hours_stage s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM machine_running_hours h
+            WHERE h.machine_id = s.machine_id AND substr(h.recorded_date, 1, 10) = s.recorded_date
+        )
+    ''').fetchall()
+    conn.executemany(f'''
+        INSERT INTO machine_running_hours ({', '.join(insert_cols)})
+        SELECT {', '.join(select_cols)} FROM hours_stage s
+        WHERE s.machine_id = ? AND s.recorded_date = ?
+    ''', [(str(uuid.uuid4()), m, d) for m, d in new])
+    return updated, len(new)
+
+
+def run(session, paths, sheet=None, allow_decrease=False, dry_run=False):
+    conn = session.conn
+    started = time.perf_counter()
+    _stage_table(conn)
+    read, unresolved = stage(session, paths, sheet)
+    staged = conn.execute('SELECT count(*) FROM hours_stage').fetchone()[0]
+    rejected = check_monotonic(conn, allow_decrease)
+    print(f"Read {read} rows from {len(paths)} files: {staged} machine-days staged.")
+    if unresolved:
+        top = sorted(unresolved.items(), key=lambda kv: -kv[1])[:10]
+        print(f"  {sum(unresolved.values())} rows with unknown machines: "
+              + ', '.join(f"{k} ({v})" for k, v in top))
+    if rejected:
+        action = 'kept (--allow-decrease)' if allow_decrease else 'rejected'
+        print(f"  {len(rejected)} readings out of order with other cumulative values {action}:")
+        for machine_id, day, value, limit in rejected[:10]:
+            m = session.machine_by_id(machine_id)
+            print(f"    {m['machine_no'] if m else machine_id} {day}: {value:g} {'<' if value < limit else '>'} {limit:g}")
+    if dry_run:
+        conn.rollback()
+        print(f"Dry run, nothing written ({time.perf_counter() - started:.2f}s).")
+        return 0
+    updated, inserted = upsert(conn)
+    conn.execute('DROP TABLE temp.hours_stage')
+    session.commit()
+    print(f"Inserted {inserted}, updated {updated} readings in {time.perf_counter() - started:.2f}s.")
+    return inserted + updated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stream running-hours workbooks into machine_running_hours.')
+    parser.add_argument('--db', default=db_path)
+    parser.add_argument('files', nargs='+', help='.xlsx files or glob patterns')
+    parser.add_argument('--sheet', help='only this sheet name')
+    parser.add_argument('--allow-decrease', action='store_true', help='import readings that go backwards')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args(argv)
+
+    paths = sorted({p for pattern in args.files for p in (glob.glob(pattern) or [pattern])})
+    with Session(args.db) as session:
+        run(session, paths, args.sheet, args.allow_decrease, args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Change detection for the incrementally refreshed tables.
+
+machine_events.py and failure_analytics.py re-read only the source rows that
+changed since their previous refresh. Timestamps in this database are written
+in two forms: ISO local time with a 'T' (the app's toIso8601String, Python's
+isoformat) and UTC 'YYYY-MM-DD HH:MM:SS' from CURRENT_TIMESTAMP. Compared as
+text, '2026-03-01 20:00' sorts before '2026-03-01T08:00', and a local stamp
+runs seven hours ahead of a UTC one written at the same moment, so
+``updated_at > <largest updated_at seen>`` misses updates. Instead:
+
+- stamps are compared normalised, through ``stamp(column)``;
+- the watermark is the UTC time of the previous refresh, not the largest
+  stamp seen, so local or future-dated stamps cannot push it ahead;
+- each refresh re-reads rows stamped up to LOOKBACK before the watermark,
+  which covers the local/UTC skew and clients that took their timestamp
+  while the refresh held the write lock; re-reading a row is harmless;
+- rows above the highest rowid seen are always read, so inserts with
+  backdated stamps (imports) are picked up;
+- a row also counts as changed when a parent it copies columns from (the
+  work order of a parts transaction, the plan of a PM execution) changed.
+
+Updates that touch no stamp (fix_legacy_wo.py backdates updated_at) are
+still invisible and need a full rebuild.
+"""
+
+LOOKBACK = '-1 day'
+
+
+def stamp(column):
+    """SQL expression for a timestamp column in comparable 'YYYY-MM-DD HH:MM:SS' form."""
+    return f"datetime(replace({column}, 'T', ' '))"
+
+
+def ensure_state(conn, table):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            source        TEXT PRIMARY KEY,
+            max_rowid     INTEGER NOT NULL DEFAULT 0,
+            watermark     TEXT NOT NULL DEFAULT '',
+            refreshed_at  DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def last_refresh(conn, table, source):
+    """(max_rowid, cutoff) of the previous refresh of ``source``; (0, '') if none."""
+    row = conn.execute(
+        f"SELECT max_rowid, COALESCE(datetime(watermark, '{LOOKBACK}'), '') FROM {table} WHERE source = ?",
+        (source,),
+    ).fetchone()
+    return tuple(row) if row else (0, '')
+
+
+def changed(last, stamps, parents=()):
+    """WHERE condition and params selecting rows new or changed since ``last``.
+
+    ``stamps`` are timestamp columns of the row. ``parents`` are
+    (column, source, key, stamps): the row also counts as changed when
+    ``column`` is the ``key`` of a ``source`` row (a table or join) with one
+    of its ``stamps`` after the cutoff.
+    """
+    max_rowid, cutoff = last
+    terms, params = ['rowid > ?'], [max_rowid]
+    for column in stamps:
+        terms.append(f"{stamp(column)} > ?")
+        params.append(cutoff)
+    for column, source, key, parent_stamps in parents:
+        terms.append(f"{column} IN (SELECT {key} FROM {source} WHERE "
+                     f"{' OR '.join(f'{stamp(c)} > ?' for c in parent_stamps)})")
+        params.extend([cutoff] * len(parent_stamps))
+    return ' OR '.join(terms), tuple(params)
+
+
+def record(conn, table, source, scanned, last=(0, '')):
+    """Store the highest rowid of the ``scanned`` table and now as the watermark.
+
+    Call inside the refresh's write transaction, after reading the changes.
+    """
+    conn.execute(f'''
+        INSERT INTO {table} (source, max_rowid, watermark, refreshed_at)
+        SELECT ?, max(COALESCE(max(rowid), 0), ?), datetime('now'), CURRENT_TIMESTAMP FROM {scanned}
+        WHERE true
+        ON CONFLICT(source) DO UPDATE SET
+            max_rowid = excluded.max_rowid, watermark = excluded.watermark, refreshed_at = excluded.refreshed_at
+    ''', (source, last[0]))
@@ -0,0 +1,176 @@
+"""Referential-integrity sweep over logical references.
+
+Several columns reference other tables only by convention (no FOREIGN KEY):
+work_orders.machine_id, pm_am_plans.machine_id, work_permits.machine_id,
+file_assets.entity_id (per module_type) and knowledge_vectors.source_id (per
+source_type). The fix scripts found broken links one row at a time; here
+every relationship is declared once in RELATIONSHIPS and checked with a
+single anti-join (NOT EXISTS), which SQLite answers with one pass over the
+child table and an index probe per row.
+
+Checks are independent, so they run in a thread pool, each on its own
+connection with ``PRAGMA query_only`` set (sqlite3 releases the GIL while a
+query runs). The report lists orphan counts and a few sample values per
+relationship, most frequent values first.
+
+Usage:
+    python integrity.py
+    python integrity.py --only work_orders --samples 10 --json report.json
+"""
+import argparse
+import json
+import sqlite3
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from session import db_path
+
+SAMPLES = 5
+WORKERS = 4
+
+# child.column must exist in parent.key; ``where`` narrows the child rows
+# (polymorphic columns), ``allow`` lists placeholder values that are valid.
+Relation = namedtuple('Relation', 'child column parent key where allow')
+Relation.__new__.__defaults__ = (None, ())
+
+RELATIONSHIPS = [
+    Relation('work_orders', 'machine_id', 'machines', 'machine_id', allow=('GENERAL',)),
+    Relation('work_orders', 'snapshot_id', 'machine_snapshots', 'snapshot_id'),
+    Relation('work_orders', 'assigned_to', 'users', 'user_id'),
+    Relation('work_orders', 'created_by', 'users', 'user_id', allow=('system',)),
+    Relation('pm_am_plans', 'machine_id', 'machines', 'machine_id'),
+    Relation('pm_am_plans', 'snapshot_id', 'machine_snapshots', 'snapshot_id'),
+    Relation('pm_am_schedules', 'plan_id', 'pm_am_plans', 'plan_id'),
+    Relation('pm_am_executions', 'schedule_id', 'pm_am_schedules', 'schedule_id'),
+    Relation('work_permits', 'machine_id', 'machines', 'machine_id'),
+    Relation('work_permits', 'wo_id', 'work_orders', 'wo_id'),
+    Relation('machine_snapshots', 'machine_id', 'machines', 'machine_id'),
+    Relation('machine_running_hours', 'machine_id', 'machines', 'machine_id'),
+    Relation('machines', 'category_id', 'machine_categories', 'category_id'),
+    Relation('machines', 'dept_id', 'departments', 'dept_id'),
+    Relation('machines', 'supplier_id', 'suppliers', 'supplier_id'),
+    Relation('spare_parts', 'supplier_id', 'suppliers', 'supplier_id'),
+    Relation('spare_parts_transactions', 'part_id', 'spare_parts', 'part_id'),
+    Relation('spare_parts_inventory', 'part_id', 'spare_parts', 'part_id'),
+    Relation('technician_skills', 'technician_id', 'users', 'user_id'),
+    Relation('technician_availability', 'technician_id', 'users', 'user_id'),
+    Relation('file_assets', 'entity_id', 'work_orders', 'wo_id', "module_type = 'work_order'"),
+    Relation('file_assets', 'entity_id', 'spare_parts', 'part_id', "module_type = 'spare_part'"),
+    Relation('file_assets', 'entity_id', 'tools', 'tool_id', "module_type = 'tool'"),
+    Relation('file_assets', 'entity_id', 'machine_handover', 'handover_id', "module_type = 'machine_handover'"),
+    Relation('knowledge_vectors', 'source_id', 'work_orders', 'wo_id', "source_type = 'work_order'"),
+    Relation('knowledge_vectors', 'source_id', 'pm_am_plans', 'plan_id', "source_type = 'pm_plan'"),
+    Relation('knowledge_vectors', 'source_id', 'machines', 'machine_id', "source_type = 'machine_spec'"),
+    Relation('knowledge_vectors', 'source_id', 'spare_parts', 'part_id', "source_type = 'spare_part'"),
+    Relation('knowledge_vectors', 'source_id', 'tools', 'tool_id', "source_type = 'tool_equipment'"),
+    Relation('knowledge_vectors', 'source_id', 'production_lines', 'line_id', "source_type = 'line_balancing'"),
+    Relation('knowledge_vectors', 'source_id', 'work_processes', 'process_id', "source_type = 'work_process'"),
+]
+
+
+def label(rel):
+    text = f"{rel.child}.{rel.column} -> {rel.parent}.{rel.key}"
+    return f"{text} [{rel.where}]" if rel.where else text
+
+
+def orphan_sql(rel, samples):
+    conditions = [f"c.{rel.column} IS NOT NULL", f"c.{rel.column} != ''"]
+    if rel.where:
+        conditions.append(f"c.{rel.where}")
+    if rel.allow:
+        conditions.append(f"c.{rel.column} NOT IN ({', '.join('?' * len(rel.allow))})")
+    # Orphans grouped by value (materialised once); the totals row is always
+    # returned, joined to at most ``samples`` of the most frequent values.
+    return f'''
+        WITH orphans AS MATERIALIZED (
+            SELECT c.{rel.column} AS value, count(*) AS n
+            FROM {rel.child} c
+            WHERE {' AND '.join(conditions)}
+              AND NOT EXISTS (SELECT 1 FROM {rel.parent} p WHERE p.{rel.key} = c.{rel.column})
+            GROUP BY c.{rel.column}
+        )
+        SELECT COALESCE(t.rows, 0), t.n_values, s.value, s.n
+        FROM (SELECT sum(n) AS rows, count(*) AS n_values FROM orphans) t
+        LEFT JOIN (SELECT value, n FROM orphans ORDER BY n DESC LIMIT {int(samples)}) s
+        ORDER BY s.n DESC
+    ''', tuple(rel.allow)
+
+
+def _columns(conn):
+    tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    return {t: {r[1] for r in conn.execute(f"PRAGMA table_info('{t}')")} for t in tables}
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute('PRAGMA query_only = ON')
+    return conn
+
+
+def check(path, rel, samples=SAMPLES):
+    started = time.perf_counter()
+    conn = _connect(path)
+    try:
+        sql, params = orphan_sql(rel, samples)
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+    return {
+        'relationship': label(rel),
+        'orphans': rows[0][0],
+        'values': rows[0][1],
+        'samples': [{'value': r[2], 'rows': r[3]} for r in rows if r[3]],
+        'elapsed_sec': round(time.perf_counter() - started, 4),
+    }
+
+
+def sweep(path, relationships=RELATIONSHIPS, samples=SAMPLES, workers=WORKERS):
+    """Run every applicable check concurrently; returns (results, skipped labels)."""
+    conn = _connect(path)
+    try:
+        columns = _columns(conn)
+    finally:
+        conn.close()
+    todo, skipped = [], []
+    for rel in relationships:
+        if rel.column in columns.get(rel.child, ()) and rel.key in columns.get(rel.parent, ()):
+            todo.append(rel)
+        else:
+            skipped.append(label(rel))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda rel: check(path, rel, samples), todo))
+    return results, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Report orphaned logical references.')
+    parser.add_argument('--db', default=db_path)
+    parser.add_argument('--only', nargs='+', metavar='TABLE', help='check only these child tables')
+    parser.add_argument('--samples', type=int, default=SAMPLES)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--json', metavar='PATH', help='also write the report as JSON')
+    args = parser.parse_args(argv)
+
+    relationships = [r for r in RELATIONSHIPS if not args.only or r.child in args.only]
+    started = time.perf_counter()
+    results, skipped = sweep(args.db, relationships, args.samples, args.workers)
+    elapsed = time.perf_counter() - started
+
+    for r in results:
+        status = f"{r['orphans']} orphan rows, {r['values']} distinct values" if r['orphans'] else 'ok'
+        print(f"{r['relationship']}: {status} ({r['elapsed_sec'] * 1000:.0f}ms)")
+        for sample in r['samples']:
+            print(f"    {sample['value']} ({sample['rows']} rows)")
+    for text in skipped:
+        print(f"{text}: skipped (table or column missing)")
+    broken = sum(1 for r in results if r['orphans'])
+    print(f"Checked {len(results)} relationships in {elapsed:.2f}s: {broken} with orphans.")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'results': results, 'skipped': skipped}, f, ensure_ascii=False, indent=1)
+    return broken
+
+
+if __name__ == '__main__':
+    main()
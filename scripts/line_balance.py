@@ -0,0 +1,410 @@
+"""Line balancing for production_lines / production_line_stations.
+
+Each station row on the line-balancing canvas is treated as a task: its
+``cycle_time_sec`` is the work content and ``prev_station_ids`` /
+``next_station_ids`` give the precedence graph. The solver groups tasks into
+as few workstations as the takt time allows:
+
+    takt = available_time_min * 60 / demand_quantity
+
+1. Ranked positional weight (RPW): positional weight = own time + time of
+   every task that must follow it (transitive closure, computed with NumPy);
+   tasks are assigned in weight order to the open station while they fit.
+2. Local search: try to empty the lightest station by moving its tasks to
+   other stations inside their precedence window, then shift single tasks to
+   reduce the sum of squared station loads (smoother line, lower max load).
+
+The proposal is written as a new production line (so it opens on the canvas
+next to the original) plus a row in line_balance_proposals with the
+efficiency it achieves. The original line is left untouched.
+
+Usage:
+    python line_balance.py list
+    python line_balance.py solve <line_id> [--write]
+    python line_balance.py bench [--tasks 100 300 1000]
+"""
+import argparse
+import datetime
+import json
+import math
+import time
+import uuid
+
+import numpy as np
+
+from session import Session, db_path
+
+SWEEPS = 20                 # local-search passes over all tasks
+POS_X, POS_Y, POS_STEP = 1600.0, 1850.0, 320.0  # canvas layout of the proposal
+
+
+class Line:
+    """Tasks of one line as arrays: times, precedence edges and topological order."""
+
+    def __init__(self, ids, names, times, edges, takt):
+        self.ids = ids
+        self.names = names
+        self.times = np.asarray(times, dtype=float)
+        self.takt = takt
+        n = len(ids)
+        self.succ = [[] for _ in range(n)]
+        self.pred = [[] for _ in range(n)]
+        for a, b in edges:
+            self.succ[a].append(b)
+            self.pred[b].append(a)
+        self.order = _topological_order(self.succ, self.pred)
+
+    @classmethod
+    def from_db(cls, conn, line_id):
+        line = conn.execute(
+            'SELECT line_name, available_time_min, demand_quantity FROM production_lines WHERE line_id = ?',
+            (line_id,)
+        ).fetchone()
+        if not line:
+            raise ValueError(f"Line {line_id} not found")
+        _, available_min, demand = line
+        rows = conn.execute('''
+            SELECT station_id, station_name, cycle_time_sec, prev_station_ids, next_station_ids
+            FROM production_line_stations WHERE line_id = ? ORDER BY station_no
+        ''', (line_id,)).fetchall()
+        index = {r[0]: i for i, r in enumerate(rows)}
+        edges = set()
+        for i, (_, _, _, prevs, nexts) in enumerate(rows):
+            for p in _ids(prevs):
+                if p in index:
+                    edges.add((index[p], i))
+            for nx in _ids(nexts):
+                if nx in index:
+                    edges.add((i, index[nx]))
+        takt = available_min * 60 / demand if demand else 0.0
+        return cls([r[0] for r in rows], [r[1] for r in rows], [r[2] or 0.0 for r in rows],
+                   sorted(edges), takt)
+
+    def positional_weights(self):
+        """Own time plus the time of every transitive successor."""
+        n = len(self.ids)
+        reach = np.zeros((n, n), dtype=bool)
+        for i in reversed(self.order):
+            for j in self.succ[i]:
+                reach[i] |= reach[j]
+                reach[i, j] = True
+        return self.times + reach.astype(float) @ self.times
+
+
+def _ids(value):
+    if not value:
+        return []
+    try:
+        return json.loads(value)
+    except ValueError:
+        return []
+
+
+def _topological_order(succ, pred):
+    indegree = [len(p) for p in pred]
+    ready = [i for i, d in enumerate(indegree) if d == 0]
+    order = []
+    while ready:
+        i = ready.pop()
+        order.append(i)
+        for j in succ[i]:
+            indegree[j] -= 1
+            if indegree[j] == 0:
+                ready.append(j)
+    if len(order) != len(pred):
+        raise ValueError('Precedence graph has a cycle')
+    return order
+
+
+def rpw_assign(line, cycle):
+    """Station index per task by ranked positional weight."""
+    n = len(line.ids)
+    weights = line.positional_weights()
+    rank = sorted(range(n), key=lambda i: -weights[i])
+    station = [-1] * n
+    waiting = [len(p) for p in line.pred]
+    available = {i for i in range(n) if waiting[i] == 0}
+    current, load, done = 0, 0.0, 0
+    while done < n:
+        task = next((i for i in rank if i in available and load + line.times[i] <= cycle + 1e-9), None)
+        if task is None:
+            if load == 0:
+                # A task longer than the cycle gets a station of its own.
+                task = next(i for i in rank if i in available)
+            else:
+                current, load = current + 1, 0.0
+                continue
+        station[task] = current
+        load += line.times[task]
+        available.discard(task)
+        done += 1
+        for j in line.succ[task]:
+            waiting[j] -= 1
+            if waiting[j] == 0:
+                available.add(j)
+    return station
+
+
+def _window(line, station, task):
+    lo = max((station[p] for p in line.pred[task]), default=0)
+    hi = min((station[s] for s in line.succ[task]), default=max(station))
+    return lo, hi
+
+
+def _renumber(station):
+    used = sorted(set(station))
+    remap = {s: k for k, s in enumerate(used)}
+    return [remap[s] for s in station]
+
+
+def improve(line, station, cycle, sweeps=SWEEPS):
+    """Local search: drop stations where possible, then smooth the loads."""
+    station = list(station)
+    times = line.times
+
+    def loads_of(st):
+        loads = np.zeros(max(st) + 1)
+        np.add.at(loads, st, times)
+        return loads
+
+    # Phase 1: empty the lightest stations by relocating their tasks.
+    improved = True
+    while improved and max(station) > 0:
+        improved = False
+        loads = loads_of(station)
+        for target in np.argsort(loads):
+            trial = list(station)
+            trial_loads = loads.copy()
+            tasks = [i for i in line.order if trial[i] == target]
+            ok = True
+            for task in tasks:
+                lo, hi = _window(line, trial, task)
+                options = [s for s in range(lo, hi + 1)
+                           if s != target and trial_loads[s] + times[task] <= cycle + 1e-9]
+                if not options:
+                    ok = False
+                    break
+                # Best fit keeps room free on the other stations.
+                best = max(options, key=lambda s: trial_loads[s])
+                trial[task] = best
+                trial_loads[best] += times[task]
+                trial_loads[target] -= times[task]
+            if ok:
+                station = _renumber(trial)
+                improved = True
+                break
+
+    # Phase 2: single-task shifts that lower the sum of squared loads.
+    loads = loads_of(station)
+    for _ in range(sweeps):
+        moved = False
+        for task in line.order:
+            src = station[task]
+            lo, hi = _window(line, station, task)
+            t = times[task]
+            best, best_gain = src, 1e-9
+            for dst in range(lo, hi + 1):
+                if dst == src or loads[dst] + t > cycle + 1e-9:
+                    continue
+                # change in sum of squares when moving t from src to dst
+                gain = 2 * t * (loads[src] - loads[dst] - t)
+                if gain > best_gain:
+                    best, best_gain = dst, gain
+            if best != src:
+                station[task] = best
+                loads[src] -= t
+                loads[best] += t
+                moved = True
+        if not moved:
+            break
+    return station
+
+
+def balance(line):
+    """Solve a line; returns a result dict with the assignment and its metrics."""
+    started = time.perf_counter()
+    total = float(line.times.sum())
+    longest = float(line.times.max()) if len(line.times) else 0.0
+    cycle = line.takt if line.takt > 0 else longest
+    warnings = []
+    if longest > cycle:
+        warnings.append(f"longest task {longest:.1f}s exceeds takt {cycle:.1f}s")
+    station = rpw_assign(line, max(cycle, longest))
+    rpw_count = max(station) + 1 if station else 0
+    station = improve(line, station, max(cycle, longest))
+    count = max(station) + 1 if station else 0
+    loads = np.zeros(count)
+    np.add.at(loads, station, line.times)
+    return {
+        'takt_time_sec': line.takt,
+        'stations': count,
+        'rpw_stations': rpw_count,
+        'min_stations': math.ceil(total / cycle) if cycle else 0,
+        'assignment': station,
+        'loads': loads.tolist(),
+        'max_load_sec': float(loads.max()) if count else 0.0,
+        # Same definition as the canvas: total / (stations x bottleneck).
+        'efficiency': total / (count * loads.max()) * 100 if count and loads.max() else 0.0,
+        'takt_efficiency': total / (count * cycle) * 100 if count and cycle else 0.0,
+        'warnings': warnings,
+        'elapsed_sec': time.perf_counter() - started,
+    }
+
+
+def ensure_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS line_balance_proposals (
+            proposal_id       TEXT PRIMARY KEY,
+            line_id           TEXT NOT NULL,
+            proposal_line_id  TEXT NOT NULL,
+            takt_time_sec     REAL,
+            stations          INTEGER NOT NULL,
+            min_stations      INTEGER NOT NULL,
+            max_load_sec      REAL,
+            efficiency        REAL,
+            takt_efficiency   REAL,
+            assignment_json   TEXT,
+            created_at        DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def write_proposal(conn, line_id, line, result):
+    """Store the proposal as a new line of merged stations; returns its line_id."""
+    src = conn.execute('''
+        SELECT line_name, department, available_time_min, demand_quantity, electricity_rate, fuel_rate
+        FROM production_lines WHERE line_id = ?
+    ''', (line_id,)).fetchone()
+    workers = dict(conn.execute(
+        'SELECT station_id, workers FROM production_line_stations WHERE line_id = ?', (line_id,)
+    ).fetchall())
+    new_line = str(uuid.uuid4())
+    count = result['stations']
+    members = [[] for _ in range(count)]
+    for i in line.order:
+        members[result['assignment'][i]].append(i)
+    new_ids = [str(uuid.uuid4()) for _ in range(count)]
+    nexts = [set() for _ in range(count)]
+    for a in range(len(line.ids)):
+        for b in line.succ[a]:
+            sa, sb = result['assignment'][a], result['assignment'][b]
+            if sa != sb:
+                nexts[sa].add(sb)
+    prevs = [set() for _ in range(count)]
+    for sa in range(count):
+        for sb in nexts[sa]:
+            prevs[sb].add(sa)
+
+    now = datetime.datetime.now().isoformat()
+    with conn:
+        ensure_tables(conn)
+        conn.execute('''
+            INSERT INTO production_lines (
+                line_id, line_name, department, available_time_min, demand_quantity,
+                electricity_rate, fuel_rate, created_at, updated_at
+            ) VALUES (?,?,?,?,?,?,?,?,?)
+        ''', (
+            new_line, f"{src[0]} (balanced {count} st., {result['efficiency']:.1f}%)", src[1],
+            src[2], src[3], src[4], src[5], now, now
+        ))
+        conn.executemany('''
+            INSERT INTO production_line_stations (
+                station_id, line_id, station_no, station_name, cycle_time_sec, workers,
+                pos_x, pos_y, prev_station_ids, next_station_ids
+            ) VALUES (?,?,?,?,?,?,?,?,?,?)
+        ''', [
+            (
+                new_ids[k], new_line, k + 1, ' + '.join(line.names[i] for i in members[k]),
+                result['loads'][k], max(workers.get(line.ids[i]) or 1 for i in members[k]),
+                POS_X + POS_STEP * k, POS_Y,
+                json.dumps([new_ids[p] for p in sorted(prevs[k])]),
+                json.dumps([new_ids[s] for s in sorted(nexts[k])]),
+            )
+            for k in range(count)
+        ])
+        conn.execute('''
+            INSERT INTO line_balance_proposals (
+                proposal_id, line_id, proposal_line_id, takt_time_sec, stations, min_stations,
+                max_load_sec, efficiency, takt_efficiency, assignment_json, created_at
+            ) VALUES (?,?,?,?,?,?,?,?,?,?,?)
+        ''', (
+            str(uuid.uuid4()), line_id, new_line, result['takt_time_sec'], count, result['min_stations'],
+            result['max_load_sec'], result['efficiency'], result['takt_efficiency'],
+            json.dumps({line.ids[i]: new_ids[result['assignment'][i]] for i in range(len(line.ids))}),
+            now
+        ))
+    return new_line
+
+
+def generate_line(n, seed=0, takt=60.0, density=2.0):
+    """Random layered precedence graph for benchmarking."""
+    rng = np.random.default_rng(seed)
+    times = rng.uniform(2, takt * 0.6, size=n).round(1)
+    layer = np.sort(rng.integers(0, max(1, n // 5), size=n))
+    edges = set()
+    for b in range(n):
+        earlier = np.nonzero(layer < layer[b])[0]
+        if len(earlier):
+            k = min(len(earlier), rng.poisson(density) + 1)
+            for a in rng.choice(earlier[-50:], size=min(k, len(earlier[-50:])), replace=False):
+                edges.add((int(a), b))
+    ids = [f"T{i}" for i in range(n)]
+    return Line(ids, ids, times, sorted(edges), takt)
+
+
+def bench(sizes, repeat=3):
+    print(f"{'tasks':>6} {'edges':>6} {'LB':>5} {'RPW':>5} {'final':>5} {'eff%':>6} {'time':>8}")
+    for n in sizes:
+        for seed in range(repeat):
+            line = generate_line(n, seed)
+            r = balance(line)
+            edges = sum(len(s) for s in line.succ)
+            print(
+                f"{n:>6} {edges:>6} {r['min_stations']:>5} {r['rpw_stations']:>5} {r['stations']:>5} "
+                f"{r['efficiency']:>6.1f} {r['elapsed_sec'] * 1000:>6.0f}ms"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Balance a production line against its takt time.')
+    parser.add_argument('--db', default=db_path)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help='list production lines')
+    p = sub.add_parser('solve', help='balance one line')
+    p.add_argument('line_id')
+    p.add_argument('--write', action='store_true', help='save the proposal as a new line')
+    p = sub.add_parser('bench', help='benchmark on generated lines')
+    p.add_argument('--tasks', type=int, nargs='+', default=[50, 100, 300, 1000])
+    p.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        return bench(args.tasks, args.repeat)
+
+    with Session(args.db) as session:
+        conn = session.conn
+        if args.command == 'list':
+            for line_id, name, n in conn.execute('''
+                SELECT l.line_id, l.line_name, count(s.station_id)
+                FROM production_lines l LEFT JOIN production_line_stations s ON s.line_id = l.line_id
+                GROUP BY l.line_id ORDER BY l.created_at
+            '''):
+                print(f"{line_id}  {name} ({n} stations)")
+            return
+        line = Line.from_db(conn, args.line_id)
+        r = balance(line)
+        print(
+            f"Takt {r['takt_time_sec']:.1f}s: {r['stations']} stations (RPW {r['rpw_stations']}, "
+            f"lower bound {r['min_stations']}), bottleneck {r['max_load_sec']:.1f}s, "
+            f"efficiency {r['efficiency']:.1f}% ({r['takt_efficiency']:.1f}% of takt) "
+            f"in {r['elapsed_sec'] * 1000:.0f}ms"
+        )
+        for w in r['warnings']:
+            print(f"Warning: {w}")
+        if args.write:
+            new_line = write_proposal(conn, args.line_id, line, r)
+            print(f"Proposal saved as line {new_line}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""Materialised per-machine event history.
+
+The AI chat timeline and the machine history screens fan out over six tables
+for one machine. machine_events keeps one narrow row per event instead:
+
+    work_orders, pm_am_executions (via schedule -> plan), work_permits,
+    machine_running_hours, spare_parts_transactions (via the work order in
+    reference_id) and machine_snapshots.
+
+The table is WITHOUT ROWID with primary key (machine_id, event_time, source,
+source_id), so it is its own covering index: a machine's history is one
+range scan. A unique index on (source, source_id) lets a refresh replace
+changed rows.
+
+Refreshes are incremental per source (see incremental.py): each refresh
+re-reads the rows added or stamped since the previous one, plus rows whose
+parent changed, since part and PM events take machine_id from their work
+order and plan. Rows deleted at the source are purged with one anti-join.
+Updates that touch no timestamp (fix_legacy_wo.py backdating updated_at,
+running hours corrected in place) need ``--full``.
+
+Usage:
+    python machine_events.py                  # incremental refresh
+    python machine_events.py --full           # rebuild
+    python machine_events.py PT-03 --limit 20 # show a machine's history
+"""
+import argparse
+import time
+
+from incremental import changed, ensure_state, last_refresh, record
+from session import Session, db_path
+
+STATE = 'machine_event_sources'
+
+# source -> (table, id column, timestamp columns, parents (see incremental.changed),
+#            SELECT producing machine_id, event_time, source_id, status, summary for rows "s")
+SOURCES = {
+    'work_order': ('work_orders', 'wo_id', ('updated_at',), (), '''
+        SELECT s.machine_id, s.created_at AS event_time, s.wo_id AS source_id, s.status,
+               s.wo_no || ': ' || s.title AS summary
+        FROM work_orders s
+    '''),
+    'pm_am': ('pm_am_executions', 'execution_id', ('created_at', 'started_at', 'completed_at'), (
+        ('schedule_id', 'pm_am_schedules sc JOIN pm_am_plans p ON p.plan_id = sc.plan_id', 'sc.schedule_id',
+         ('sc.updated_at', 'p.updated_at')),
+    ), '''
+        SELECT p.machine_id, COALESCE(s.completed_at, s.started_at, s.created_at) AS event_time,
+               s.execution_id AS source_id, s.result AS status, p.plan_code || ': ' || p.plan_name AS summary
+        FROM pm_am_executions s
+        JOIN pm_am_schedules sc ON sc.schedule_id = s.schedule_id
+        JOIN pm_am_plans p ON p.plan_id = sc.plan_id
+    '''),
+    'permit': ('work_permits', 'permit_id', ('updated_at',), (), '''
+        SELECT s.machine_id, s.created_at AS event_time, s.permit_id AS source_id, s.status,
+               s.permit_no || ': ' || s.permit_type AS summary
+        FROM work_permits s
+    '''),
+    'running_hours': ('machine_running_hours', 'hours_id', ('created_at',), (), '''
+        SELECT s.machine_id, s.recorded_date AS event_time, s.hours_id AS source_id, NULL AS status,
+               printf('%.1f h (total %.1f h)', COALESCE(s.daily_hours, 0), s.cumulative_hours) AS summary
+        FROM machine_running_hours s
+    '''),
+    'part': ('spare_parts_transactions', 'trans_id', ('trans_date',), (
+        ('reference_id', 'work_orders', 'wo_id', ('updated_at',)),
+    ), '''
+        SELECT w.machine_id, s.trans_date AS event_time, s.trans_id AS source_id, s.trans_type AS status,
+               COALESCE(p.part_code, s.part_id) || ' x' || s.quantity || ' (' || w.wo_no || ')' AS summary
+        FROM spare_parts_transactions s
+        JOIN work_orders w ON w.wo_id = s.reference_id
+        LEFT JOIN spare_parts p ON p.part_id = s.part_id
+    '''),
+    'snapshot': ('machine_snapshots', 'snapshot_id', ('captured_at',), (), '''
+        SELECT s.machine_id, s.captured_at AS event_time, s.snapshot_id AS source_id, NULL AS status,
+               s.machine_no || COALESCE(' ' || s.machine_name, '') AS summary
+        FROM machine_snapshots s
+    '''),
+}
+
+
+def ensure_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS machine_events (
+            machine_id  TEXT NOT NULL,
+            event_time  TEXT NOT NULL,
+            source      TEXT NOT NULL,
+            source_id   TEXT NOT NULL,
+            status      TEXT,
+            summary     TEXT,
+            PRIMARY KEY (machine_id, event_time, source, source_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_machine_events_source ON machine_events(source, source_id)')
+    ensure_state(conn, STATE)
+
+
+def _tables(conn):
+    return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def refresh_source(conn, source):
+    """Re-materialise changed rows of one source; returns (changed, purged)."""
+    table, id_col, stamps, parents, select = SOURCES[source]
+    last = last_refresh(conn, STATE, source)
+    where, params = changed(last, stamps, parents)
+    conn.execute('DROP TABLE IF EXISTS temp.changed_events')
+    conn.execute(f'CREATE TEMP TABLE changed_events AS SELECT {id_col} AS id FROM {table} WHERE {where}', params)
+    count = conn.execute('SELECT count(*) FROM temp.changed_events').fetchone()[0]
+    if count:
+        conn.execute('''
+            DELETE FROM machine_events
+            WHERE source = ? AND source_id IN (SELECT id FROM temp.changed_events)
+        ''', (source,))
+        # Timestamps are stored both as 'YYYY-MM-DD HH:MM:SS' and ISO 'T' form;
+        # normalise so one machine's events sort correctly.
+        conn.execute(f'''
+            INSERT OR REPLACE INTO machine_events (machine_id, event_time, source, source_id, status, summary)
+            SELECT machine_id, replace(event_time, 'T', ' '), ?, source_id, status, summary
+            FROM ({select} WHERE s.{id_col} IN (SELECT id FROM temp.changed_events))
+            WHERE machine_id IS NOT NULL AND machine_id != '' AND event_time IS NOT NULL
+        ''', (source,))
+    purged = conn.execute(f'''
+        DELETE FROM machine_events
+        WHERE source = ? AND NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{id_col} = machine_events.source_id)
+    ''', (source,)).rowcount
+    conn.execute('DROP TABLE temp.changed_events')
+    record(conn, STATE, source, table, last)
+    return count, purged
+
+
+def refresh(conn, full=False):
+    ensure_tables(conn)
+    conn.commit()
+    tables = _tables(conn)
+    stats = {}
+    # BEGIN IMMEDIATE so no writer slips in between reading the changes and storing the watermark.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if full:
+            conn.execute('DELETE FROM machine_events')
+            conn.execute('DELETE FROM machine_event_sources')
+        for source, (table, *_rest) in SOURCES.items():
+            if table in tables:
+                stats[source] = refresh_source(conn, source)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return stats
+
+
+def history(conn, machine_id, limit=None):
+    sql = '''
+        SELECT event_time, source, status, summary FROM machine_events
+        WHERE machine_id = ? ORDER BY event_time DESC
+    '''
+    if limit:
+        sql += f' LIMIT {int(limit)}'
+    return conn.execute(sql, (machine_id,)).fetchall()
+
+
+def run(session, full=False):
+    started = time.perf_counter()
+    stats = refresh(session.conn, full)
+    for source, (count, purged) in stats.items():
+        if count or purged:
+            print(f"  {source}: {count} refreshed, {purged} purged")
+    total = session.conn.execute('SELECT count(*) FROM machine_events').fetchone()[0]
+    print(f"machine_events: {total} rows, refreshed in {time.perf_counter() - started:.2f}s")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Refresh or show the materialised machine event history.')
+    parser.add_argument('--db', default=db_path)
+    parser.add_argument('--full', action='store_true', help='rebuild from scratch')
+    parser.add_argument('machine', nargs='?', help='machine number, name or alias to show')
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    with Session(args.db) as session:
+        if not args.machine:
+            run(session, args.full)
+            return
+        m = session.registry.find(args.machine)
+        if not m:
+            print(f"{args.machine}: not found")
+            return
+        for event_time, source, status, summary in history(session.conn, m['machine_id'], args.limit):
+            print(f"{event_time}  {source:<13} {status or '':<11} {summary or ''}")
+
+
+if __name__ == '__main__':
+    main()
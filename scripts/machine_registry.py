@@ -0,0 +1,225 @@
+"""In-memory machine registry with a versioned local cache.
+
+Loads machines (joined with their category and department names), the
+category and department lists and the latest snapshot per machine into dicts
+keyed by id, machine_no, name and normalised alias, so the fix scripts resolve
+machines in O(1) instead of querying per work order or reading a hand-exported
+machines.json.
+
+The registry is pickled to a local cache directory. The cache key is built
+from cheap aggregates over the source tables (row counts and the newest
+``updated_at`` / ``captured_at``), so a cold start off the network share only
+runs a handful of ``count(*)``/``max()`` queries when nothing changed.
+machine_categories and departments have no ``updated_at``, so a rename would
+go unnoticed; those small tables are signed by a hash of their contents.
+``PRAGMA data_version`` is connection-local in SQLite, so it is used only to
+skip even that key check while one connection stays open.
+
+Usage:
+    python machine_registry.py            # build/refresh the cache and print a summary
+    python machine_registry.py PT-03      # look up a machine by number, name or alias
+"""
+import hashlib
+import os
+import pickle
+import re
+
+CACHE_FORMAT = 3
+
+
+def default_cache_dir():
+    base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'masapp')
+
+
+def normalize(text):
+    """Alias form: lower-case, no whitespace, hyphens or dots."""
+    return re.sub(r'[\s\-_.]+', '', (text or '').lower())
+
+
+def _rows(conn, sql):
+    cur = conn.execute(sql)
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+
+def _data_version(conn):
+    return conn.execute('PRAGMA data_version').fetchone()[0]
+
+
+def _content_hash(conn, table, columns, key):
+    """Digest of a small table's rows, independent of how ``updated_at`` is written."""
+    row = conn.execute(
+        f"SELECT group_concat(sig, char(30)) FROM ("
+        f"SELECT json_array({', '.join(columns)}) AS sig FROM {table} ORDER BY {key})"
+    ).fetchone()[0]
+    return hashlib.sha1((row or '').encode('utf-8')).hexdigest()
+
+
+def version_key(conn):
+    """Signature of every table the registry is built from."""
+    return (
+        CACHE_FORMAT,
+        # By content: updated_at mixes local 'T' and UTC ' ' stamps, so its max
+        # need not move when a machine is edited.
+        _content_hash(conn, 'machines', ['machine_id', 'machine_no', 'machine_name', 'asset_no', 'dept_id',
+                                         'category_id', 'location', 'status', 'is_active'], 'machine_id'),
+        conn.execute('SELECT count(*), max(captured_at) FROM machine_snapshots').fetchone(),
+        _content_hash(conn, 'machine_categories', ['category_id', 'code', 'name', 'parent_id'], 'category_id'),
+        _content_hash(conn, 'departments', ['dept_id', 'dept_code', 'dept_name'], 'dept_id'),
+    )
+
+
+class MachineRegistry:
+    def __init__(self, machines, categories, departments, snapshots, key=None):
+        self.key = key
+        self.categories = {c['category_id']: c for c in categories}
+        self.departments = {d['dept_id']: d for d in departments}
+        self.snapshots = snapshots
+        self.by_id = {}
+        self.by_no = {}
+        self.by_name = {}
+        self.by_alias = {}
+        for m in machines:
+            self._index(m)
+        self._data_version = None
+
+    def _index(self, m):
+        self.by_id[m['machine_id']] = m
+        self.by_no[m['machine_no']] = m
+        if m.get('machine_name'):
+            self.by_name.setdefault(m['machine_name'], m)
+        for alias in (m['machine_no'], m.get('machine_name'), m.get('asset_no')):
+            if alias:
+                self.by_alias.setdefault(normalize(alias), m)
+
+    # -- loading -----------------------------------------------------------
+
+    @classmethod
+    def from_db(cls, conn, key=None):
+        machines = _rows(conn, '''
+            SELECT m.*, d.dept_name, c.name AS category_name
+            FROM machines m
+            LEFT JOIN departments d ON d.dept_id = m.dept_id
+            LEFT JOIN machine_categories c ON c.category_id = m.category_id
+            ORDER BY m.machine_no
+        ''')
+        categories = _rows(conn, 'SELECT * FROM machine_categories')
+        departments = _rows(conn, 'SELECT * FROM departments')
+        # Ascending order so the latest capture per machine wins the dict slot.
+        snapshots = dict(conn.execute(
+            'SELECT machine_id, snapshot_id FROM machine_snapshots ORDER BY captured_at'
+        ).fetchall())
+        return cls(machines, categories, departments, snapshots, key=key)
+
+    @classmethod
+    def load(cls, conn, db_path, cache_dir=None):
+        """Registry from the local cache if it matches the database, else rebuilt and re-cached."""
+        key = version_key(conn)
+        path = cls.cache_path(db_path, cache_dir)
+        registry = None
+        try:
+            with open(path, 'rb') as f:
+                cached = pickle.load(f)
+            if cached.get('key') == key:
+                registry = cls(cached['machines'], cached['categories'], cached['departments'],
+                               cached['snapshots'], key=key)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+            pass
+        if registry is None:
+            registry = cls.from_db(conn, key=key)
+            registry.save(path)
+        registry._data_version = _data_version(conn)
+        return registry
+
+    @staticmethod
+    def cache_path(db_path, cache_dir=None):
+        digest = hashlib.sha1(os.path.abspath(db_path).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(cache_dir or default_cache_dir(), f'machine_registry-{digest}.pickle')
+
+    def save(self, path):
+        # Plain dicts and lists only, so the cache survives refactors of this class.
+        state = {
+            'key': self.key,
+            'machines': list(self.by_id.values()),
+            'categories': list(self.categories.values()),
+            'departments': list(self.departments.values()),
+            'snapshots': self.snapshots,
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def is_current(self, conn):
+        """True while nothing relevant changed since load; data_version short-circuits the check."""
+        if self._data_version is not None and _data_version(conn) == self._data_version:
+            return True
+        return version_key(conn) == self.key
+
+    # -- lookups -----------------------------------------------------------
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def machines(self):
+        return list(self.by_no.values())
+
+    def machine(self, machine_no):
+        return self.by_no.get(machine_no)
+
+    def machine_by_id(self, machine_id):
+        return self.by_id.get(machine_id)
+
+    def find(self, text):
+        """Machine by exact number or name, then by normalised alias."""
+        return self.by_no.get(text) or self.by_name.get(text) or self.by_alias.get(normalize(text))
+
+    def add_aliases(self, aliases):
+        """Register colloquial names, e.g. {'ปะกาวเลเซอร์บ่อย': 'GM-06'}; unknown numbers are ignored."""
+        for alias, machine_no in aliases.items():
+            m = self.by_no.get(machine_no) if machine_no else None
+            if m:
+                self.by_alias[normalize(alias)] = m
+
+    def match_text(self, text):
+        """First machine whose name or number appears in free text (machine_no order)."""
+        for m in self.by_no.values():
+            if (m.get('machine_name') and m['machine_name'] in text) or m['machine_no'] in text:
+                return m
+        return None
+
+    def latest_snapshot_id(self, machine_id):
+        return self.snapshots.get(machine_id)
+
+    def set_snapshot(self, machine_id, snapshot_id):
+        self.snapshots[machine_id] = snapshot_id
+
+
+def main(argv=None):
+    import argparse
+    from session import Session, db_path
+
+    parser = argparse.ArgumentParser(description='Refresh the machine registry cache or look machines up.')
+    parser.add_argument('--db', default=db_path)
+    parser.add_argument('names', nargs='*', help='machine numbers, names or aliases to look up')
+    args = parser.parse_args(argv)
+
+    with Session(args.db) as session:
+        registry = session.registry
+        if not args.names:
+            print(
+                f"{len(registry)} machines, {len(registry.categories)} categories, "
+                f"{len(registry.departments)} departments, {len(registry.snapshots)} snapshots"
+            )
+        for text in args.names:
+            m = registry.find(text)
+            if m:
+                print(f"{text}: {m['machine_no']} {m.get('machine_name') or ''} ({m['machine_id']})")
+            else:
+                print(f"{text}: not found")
+
+
+if __name__ == '__main__':
+    main()
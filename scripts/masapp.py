@@ -0,0 +1,117 @@
+"""Single entry point for the maintenance scripts.
+
+Run from the scripts directory:
+    python -m masapp fix-snapshots
+    python -m masapp --db copy.db import-suppliers --raw suppliers_raw.txt
+    python -m masapp pipeline import-legacy-wo fix-legacy-wo fix-missing-machines fix-snapshots
+    python -m masapp pipeline fix-snapshots refresh-events fit-failures
+    python -m masapp merge laptop_copy.db --dry-run
+
+merge, backup, machines, dedup-suppliers, sequences, balance-line,
+dispatch, forecast-parts, check-integrity and import-hours take their own options
+(see ``<tool> --help``); a top-level --db is passed to them as their database
+option (``--target`` for merge).
+
+Job modules are imported only when their command runs, so heavy
+dependencies (PyMuPDF for extract-pdf) never load for plain DB jobs.
+``pipeline`` runs several jobs in one process against one Session, so the
+machine and snapshot caches are loaded once and shared.
+"""
+import argparse
+import importlib
+import sys
+import time
+
+from session import Session, db_path
+
+# command -> (module, help, [(flag, run() keyword, default help)])
+JOBS = {
+    'import-legacy-wo': ('import_legacy_wo', 'insert the legacy paper log as work orders', []),
+    'fix-legacy-wo': ('fix_legacy_wo', 'fix Buddhist-era dates and machine links on legacy work orders', []),
+    'fix-snapshots': ('fix_snapshots', 'point work orders at the latest machine snapshot', []),
+    'fix-missing-machines': ('fix_missing_machines', 'map work orders without a machine by keyword', []),
+    'fix-thai-ocr': ('fix_thai_ocr', 'repair OCR-mangled Thai in supplier records', []),
+    'refresh-events': ('machine_events', 'refresh the materialised machine_events history', []),
+    'fit-failures': ('failure_analytics', 'extract component failures and re-fit Weibull reliability', []),
+    'import-suppliers': ('import_suppliers', 'import suppliers from the raw vendor list', [
+        ('--raw', 'path', 'suppliers_raw.txt exported from the vendor PDF'),
+    ]),
+    'extract-pdf': ('extract_pdf', 'dump the vendor PDF to text (needs PyMuPDF)', [
+        ('--pdf', 'pdf', 'source PDF'),
+        ('--out', 'out', 'text file to write'),
+    ]),
+}
+
+# Tools with their own argument parsers; remaining argv is handed to main(),
+# with a top-level --db passed on as the tool's database option.
+# command -> (module, help, database option)
+TOOLS = {
+    'merge': ('db_merge', 'merge an offline copy into the shared database', '--target'),
+    'backup': ('db_backup', 'incremental chunked backups', '--db'),
+    'machines': ('machine_registry', 'refresh the machine registry cache or look machines up', '--db'),
+    'dedup-suppliers': ('supplier_dedup', 'find near-duplicate suppliers and merge them by plan', '--db'),
+    'sequences': ('doc_sequence', 'show or reserve WO/WP/PR number counters', '--db'),
+    'balance-line': ('line_balance', 'balance a production line against takt time', '--db'),
+    'dispatch': ('dispatch', 'assign open work orders to technicians in one batch', '--db'),
+    'forecast-parts': ('parts_forecast', 'forecast spare-part demand and suggest reorder levels', '--db'),
+    'check-integrity': ('integrity', 'report orphaned logical references', '--db'),
+    'import-hours': ('import_running_hours', 'stream running-hours workbooks into machine_running_hours', '--db'),
+}
+
+
+def run_job(session, command, **kwargs):
+    module_name = JOBS[command][0]
+    module = importlib.import_module(module_name)
+    started = time.perf_counter()
+    result = module.run(session, **{k: v for k, v in kwargs.items() if v is not None})
+    print(f"[{command}] done in {time.perf_counter() - started:.2f}s")
+    return result
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m masapp', description='MASAPP maintenance jobs.')
+    parser.add_argument('--db', help='path to masapp.db (default: the shared database)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    for command, (_, help_text, options) in JOBS.items():
+        p = sub.add_parser(command, help=help_text)
+        for flag, dest, option_help in options:
+            p.add_argument(flag, dest=dest, help=option_help)
+
+    p = sub.add_parser('pipeline', help='run several jobs in one process and one DB session')
+    p.add_argument('jobs', nargs='+', choices=list(JOBS), metavar='JOB')
+
+    for command, (_, help_text, _) in TOOLS.items():
+        sub.add_parser(command, help=help_text, add_help=False)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+
+    if args.command in TOOLS:
+        module_name, _, db_option = TOOLS[args.command]
+        if args.db:
+            if any(a == db_option or a.startswith(db_option + '=') for a in extra):
+                parser.error(f"give the database once: --db or {args.command} {db_option}")
+            extra = extra + [db_option, args.db]
+        module = importlib.import_module(module_name)
+        return module.main(extra)
+    if extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+
+    with Session(args.db or db_path) as session:
+        if args.command == 'pipeline':
+            started = time.perf_counter()
+            for command in args.jobs:
+                run_job(session, command)
+            print(f"Pipeline of {len(args.jobs)} jobs finished in {time.perf_counter() - started:.2f}s")
+        else:
+            options = {dest: getattr(args, dest) for _, dest, _ in JOBS[args.command][2]}
+            run_job(session, args.command, **options)
+
+
+if __name__ == '__main__':
+    main()
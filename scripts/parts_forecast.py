@@ -0,0 +1,165 @@
+"""Spare-part demand forecast and reorder points.
+
+spare_parts.reorder_level is a static default of 5 and lead_time_days was
+never used. This job pivots the 'out' transactions into a parts x weeks
+matrix (one aggregate query) and forecasts every part at once:
+
+- each part is classified by average demand interval (ADI) and squared
+  coefficient of variation of demand sizes (CV²), per Syntetos-Boylan;
+- smooth parts use a moving average of the last MA_WEEKS weeks;
+- intermittent, erratic and lumpy parts use Croston with the SBA bias
+  correction. The recursion runs over weeks, vectorised across parts.
+
+The reorder point covers demand over the lead time plus safety stock for
+the requested service level:
+
+    ROP = rate * L + z * sigma * sqrt(L)      (L in weeks)
+
+Usage:
+    python parts_forecast.py                      # print suggested levels
+    python parts_forecast.py --service 0.98 --write
+"""
+import argparse
+import datetime
+import statistics
+import time
+
+import numpy as np
+
+from session import Session, db_path
+
+HISTORY_WEEKS = 104
+MA_WEEKS = 13
+ALPHA = 0.1                 # Croston smoothing constant
+SERVICE_LEVEL = 0.95
+DEFAULT_LEAD_DAYS = 14      # parts without lead_time_days
+ADI_CUTOFF = 1.32
+CV2_CUTOFF = 0.49
+
+
+def demand_matrix(conn, weeks=HISTORY_WEEKS, today=None):
+    """(part_ids, lead_days, matrix) with one row per active part, oldest week first."""
+    today = today or datetime.date.today()
+    # Half-open [start, tomorrow): exactly ``weeks`` buckets, the last ending today.
+    end = today + datetime.timedelta(days=1)
+    start = end - datetime.timedelta(weeks=weeks)
+    parts = conn.execute(
+        'SELECT part_id, lead_time_days, reorder_level FROM spare_parts WHERE is_active = 1 ORDER BY part_id'
+    ).fetchall()
+    index = {p[0]: i for i, p in enumerate(parts)}
+    rows = conn.execute('''
+        SELECT part_id,
+               CAST((julianday(trans_date) - julianday(?)) / 7 AS INTEGER) AS week,
+               SUM(ABS(quantity))
+        FROM spare_parts_transactions
+        WHERE trans_type = 'out' AND trans_date >= ? AND trans_date < ?
+        GROUP BY part_id, week
+    ''', (start.isoformat(), start.isoformat(), end.isoformat())).fetchall()
+    Y = np.zeros((len(parts), weeks))
+    if rows:
+        ids, week, qty = zip(*((index.get(r[0], -1), r[1], r[2]) for r in rows))
+        ids, week, qty = np.array(ids), np.array(week), np.array(qty, dtype=float)
+        keep = (ids >= 0) & (week >= 0) & (week < weeks)
+        np.add.at(Y, (ids[keep], week[keep]), qty[keep])
+    lead = np.array([p[1] if p[1] else DEFAULT_LEAD_DAYS for p in parts], dtype=float)
+    current = np.array([p[2] if p[2] is not None else 0 for p in parts])
+    return [p[0] for p in parts], lead, current, Y
+
+
+def croston_sba(Y, alpha=ALPHA):
+    """Per-part SBA demand rate per week (0 for parts without demand)."""
+    n, weeks = Y.shape
+    z = np.zeros(n)             # smoothed demand size
+    p = np.zeros(n)             # smoothed interval
+    q = np.ones(n)              # periods since last demand
+    seen = np.zeros(n, dtype=bool)
+    for t in range(weeks):
+        d = Y[:, t]
+        hit = d > 0
+        first = hit & ~seen
+        later = hit & seen
+        z = np.where(first, d, np.where(later, z + alpha * (d - z), z))
+        p = np.where(first, q, np.where(later, p + alpha * (q - p), p))
+        seen |= hit
+        q = np.where(hit, 1.0, q + 1.0)
+    rate = np.divide(z, p, out=np.zeros(n), where=p > 0)
+    return (1 - alpha / 2) * rate
+
+
+def classify(Y):
+    """ADI and CV² of non-zero demand sizes per part."""
+    nonzero = (Y > 0).sum(axis=1)
+    adi = np.divide(Y.shape[1], nonzero, out=np.full(len(Y), np.inf), where=nonzero > 0)
+    count = np.maximum(nonzero, 1)
+    mean = Y.sum(axis=1) / count
+    var = np.where(Y > 0, (Y - mean[:, None]) ** 2, 0.0).sum(axis=1) / count
+    cv2 = np.divide(var, mean ** 2, out=np.zeros(len(Y)), where=mean > 0)
+    return adi, cv2
+
+
+def forecast(Y, lead_days, service=SERVICE_LEVEL, ma_weeks=MA_WEEKS):
+    """Weekly rate, method and reorder point for every part."""
+    adi, cv2 = classify(Y)
+    smooth = (adi < ADI_CUTOFF) & (cv2 < CV2_CUTOFF)
+    moving = Y[:, -ma_weeks:].mean(axis=1)
+    sba = croston_sba(Y)
+    rate = np.where(smooth, moving, sba)
+    sigma = Y.std(axis=1, ddof=1) if Y.shape[1] > 1 else np.zeros(len(Y))
+    lead_weeks = lead_days / 7.0
+    z = statistics.NormalDist().inv_cdf(service)
+    rop = np.ceil(rate * lead_weeks + z * sigma * np.sqrt(lead_weeks))
+    method = np.where(smooth, 'ma', np.where(np.isinf(adi), 'none', 'sba'))
+    return rate, method, rop.astype(int)
+
+
+def write_levels(conn, part_ids, levels):
+    with conn:
+        conn.execute('DROP TABLE IF EXISTS temp.reorder_levels')
+        conn.execute('CREATE TEMP TABLE reorder_levels (part_id TEXT PRIMARY KEY, level INTEGER NOT NULL)')
+        conn.executemany('INSERT INTO reorder_levels VALUES (?, ?)', zip(part_ids, levels))
+        cur = conn.execute('''
+            UPDATE spare_parts
+            SET reorder_level = (SELECT level FROM reorder_levels WHERE part_id = spare_parts.part_id)
+            WHERE part_id IN (SELECT part_id FROM reorder_levels)
+        ''')
+        conn.execute('DROP TABLE temp.reorder_levels')
+    return cur.rowcount
+
+
+def run(session, service=SERVICE_LEVEL, weeks=HISTORY_WEEKS, write=False, show=20):
+    started = time.perf_counter()
+    part_ids, lead, current, Y = demand_matrix(session.conn, weeks)
+    rate, method, rop = forecast(Y, lead, service)
+    # Parts without any consumption keep their manual level.
+    has_history = method != 'none'
+    changed = has_history & (rop != current)
+    elapsed = time.perf_counter() - started
+    counts = {m: int((method == m).sum()) for m in ('ma', 'sba', 'none')}
+    print(
+        f"Forecast {len(part_ids)} parts over {weeks} weeks in {elapsed:.2f}s: "
+        f"{counts['ma']} moving average, {counts['sba']} Croston/SBA, {counts['none']} without demand"
+    )
+    for i in np.argsort(-np.abs(rop - current) * changed)[:show]:
+        if changed[i]:
+            print(f"  {part_ids[i]}: {rate[i]:.2f}/week ({method[i]}), lead {lead[i]:.0f}d, "
+                  f"reorder {current[i]} -> {rop[i]}")
+    if write:
+        idx = np.nonzero(changed)[0]
+        n = write_levels(session.conn, [part_ids[i] for i in idx], rop[idx].tolist())
+        print(f"Updated reorder_level on {n} parts.")
+    return int(changed.sum())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Forecast spare-part demand and suggest reorder levels.')
+    parser.add_argument('--db', default=db_path)
+    parser.add_argument('--service', type=float, default=SERVICE_LEVEL, help='cycle service level, e.g. 0.95')
+    parser.add_argument('--weeks', type=int, default=HISTORY_WEEKS, help='history length')
+    parser.add_argument('--write', action='store_true', help='save suggested reorder levels')
+    args = parser.parse_args(argv)
+    with Session(args.db) as session:
+        run(session, args.service, args.weeks, args.write)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Streaming row processing for the fix jobs.
+
+A fix job is source -> transform -> sink:
+
+    records = scan(conn, WorkOrder, "wo_no LIKE 'WO-2026-%'")
+    sink = UpdateSink(conn, WorkOrder, ['created_at', 'completed_at'])
+    sink.write(changed(records, fix))
+
+- Records are small ``__slots__`` objects, one class per table, instead of a
+  dict per row.
+- ``scan`` pages through the table in rowid order with ``fetchmany``. Every
+  page is a finished statement before its updates are written, so updating
+  the table being read is safe even for indexed columns.
+- ``changed`` applies per-record fix functions and yields only the records
+  they modified.
+- ``UpdateSink`` buffers updates and writes them with ``executemany`` every
+  ``size`` rows, committing each batch.
+
+Only one page and one update batch are held in memory, whatever the size of
+the table.
+"""
+
+BATCH = 1000
+
+
+class Record:
+    """Row of ``table``; subclasses list the columns they read in ``__slots__``."""
+    __slots__ = ('rowid',)
+    table = None
+
+    def __init__(self, rowid, *values):
+        self.rowid = rowid
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def values(self, names):
+        return tuple(getattr(self, name) for name in names)
+
+    def update(self, values):
+        """Set fields from a dict; True if any value actually changed."""
+        changed = False
+        for name, value in values.items():
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                changed = True
+        return changed
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}(rowid={self.rowid}, {fields})"
+
+
+class Supplier(Record):
+    __slots__ = ('supplier_id', 'name', 'contact_name', 'address', 'service_scope')
+    table = 'suppliers'
+
+
+class WorkOrder(Record):
+    __slots__ = ('wo_id', 'wo_no', 'status', 'title', 'description', 'failure_symptom',
+                 'machine_id', 'snapshot_id', 'created_at', 'started_at', 'completed_at', 'updated_at')
+    table = 'work_orders'
+
+
+def scan(conn, cls, where=None, params=(), size=BATCH):
+    """Yield ``cls`` records for the rows matching ``where``, ``size`` rows per query."""
+    sql = f"SELECT rowid, {', '.join(cls.__slots__)} FROM {cls.table} WHERE rowid > ?"
+    if where:
+        sql += f" AND ({where})"
+    sql += ' ORDER BY rowid LIMIT ?'
+    last = -(1 << 63)
+    while True:
+        rows = conn.execute(sql, (last, *params, size)).fetchmany(size)
+        for row in rows:
+            yield cls(*row)
+        if len(rows) < size:
+            return
+        last = rows[-1][0]
+
+
+def changed(records, *fixes):
+    """Apply each fix(record) -> bool in order; yield records any fix modified."""
+    for record in records:
+        hit = False
+        for fix in fixes:
+            hit = fix(record) or hit
+        if hit:
+            yield record
+
+
+class UpdateSink:
+    """Write ``columns`` of each record back by rowid, committing every ``size`` rows."""
+
+    def __init__(self, conn, cls, columns, size=BATCH):
+        self.conn = conn
+        self.columns = list(columns)
+        self.size = size
+        self.sql = f"UPDATE {cls.table} SET {', '.join(f'{c} = ?' for c in self.columns)} WHERE rowid = ?"
+        self.pending = []
+        self.count = 0
+
+    def add(self, record):
+        self.pending.append(record.values(self.columns) + (record.rowid,))
+        self.count += 1
+        if len(self.pending) >= self.size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.conn.executemany(self.sql, self.pending)
+            self.pending.clear()
+        self.conn.commit()
+
+    def write(self, records):
+        """Consume ``records`` and flush; returns the number of rows written."""
+        for record in records:
+            self.add(record)
+        self.flush()
+        return self.count
@@ -0,0 +1,89 @@
+"""Shared database session for the maintenance scripts.
+
+One Session owns one connection and one MachineRegistry (machines and the
+latest snapshot per machine), so several jobs run by ``python -m masapp
+pipeline`` look machines up from memory instead of re-querying for every
+work order.
+"""
+import datetime
+import sqlite3
+import uuid
+
+from machine_registry import MachineRegistry
+
+db_path = r'\\No1\z\05-งานส่วนแผนก\03-MA-หน่วยงานซ่อมบำรุง(Maintenance)\Database\masapp.db'
+
+
+class Session:
+    def __init__(self, path=db_path):
+        self.path = path
+        self._conn = None
+        self._registry = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+        return self._conn
+
+    def cursor(self):
+        return self.conn.cursor()
+
+    def commit(self):
+        if self._conn is not None:
+            self._conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        self.close()
+
+    # -- machine registry --------------------------------------------------
+
+    @property
+    def registry(self):
+        """MachineRegistry for this database, loaded once (from the local cache when current)."""
+        if self._registry is None:
+            self._registry = MachineRegistry.load(self.conn, self.path)
+        return self._registry
+
+    def machines(self):
+        return self.registry.machines()
+
+    def machine(self, machine_no):
+        """Machine row as a dict by machine_no, or None."""
+        return self.registry.machine(machine_no)
+
+    def machine_by_id(self, machine_id):
+        return self.registry.machine_by_id(machine_id)
+
+    def latest_snapshot_id(self, machine_id):
+        return self.registry.latest_snapshot_id(machine_id)
+
+    def ensure_snapshot(self, machine):
+        """Latest snapshot_id for a machine dict, capturing one if none exists."""
+        s_id = self.latest_snapshot_id(machine['machine_id'])
+        if s_id:
+            return s_id
+        s_id = str(uuid.uuid4())
+        now = datetime.datetime.now().isoformat()
+        self.conn.execute('''
+            INSERT INTO machine_snapshots (
+                snapshot_id, machine_id, machine_no, machine_name, brand, model,
+                dept_name, location, captured_at
+            ) VALUES (?,?,?,?,?,?,?,?,?)
+        ''', (
+            s_id, machine['machine_id'], machine.get('machine_no'), machine.get('machine_name'),
+            machine.get('brand'), machine.get('model'), machine.get('dept_name'),
+            machine.get('location'), now
+        ))
+        self.registry.set_snapshot(machine['machine_id'], s_id)
+        return s_id
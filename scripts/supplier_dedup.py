@@ -0,0 +1,322 @@
+"""Near-duplicate detection for the suppliers table.
+
+The two supplier importers and fix_thai_ocr.py leave rows such as
+'อารต์ ดไีซน์' next to 'อาร์ต ดีไซน์', and the 111A2/1A2 code extraction
+variants. Comparing every pair is O(n²), so instead:
+
+1. name, address and phone are normalised (OCR-reordered Thai marks and
+   company suffixes dropped) and cut into character shingles;
+2. each field gets a MinHash signature, computed with NumPy for all
+   suppliers at once;
+3. LSH banding over the signatures (plus exact normalised-code blocking)
+   yields candidate pairs in roughly linear time;
+4. candidates are scored from the estimated Jaccard similarities and joined
+   into clusters with union-find.
+
+Each cluster keeps the supplier with the most references; the plan repoints
+spare_parts, machines and purchase_request_items to it in bulk and
+deactivates the duplicates.
+
+Usage:
+    python supplier_dedup.py find --out supplier_merge.json
+    python supplier_dedup.py apply supplier_merge.json
+"""
+import argparse
+import datetime
+import json
+import re
+import time
+import zlib
+
+import numpy as np
+
+from session import Session, db_path
+
+NUM_PERM = 64
+BANDS = 16                  # 16 bands x 4 rows: pairs above ~0.5 Jaccard collide
+SHINGLE = 3
+PHONE_SHINGLE = 4
+MAX_BUCKET = 50             # ignore LSH buckets this large (generic names)
+BLOCK = 4096                # suppliers per vectorised MinHash block
+THRESHOLD = 0.6
+NAME_FLOOR = 0.5            # shared address or phone alone is not a duplicate
+WEIGHTS = {'name': 0.55, 'address': 0.25, 'phone': 0.20}
+CODE_BONUS = 0.1
+_PRIME = np.uint64(4294967291)  # largest prime below 2**32, keeps a*x + b inside uint64
+
+# Tables whose supplier_id is repointed to the surviving supplier.
+REFERENCES = ('spare_parts', 'machines', 'purchase_request_items')
+
+_SARA_AM = re.compile('ํา|าํ')
+_THAI_MARKS = re.compile('[ัิ-ฺ็-๎]')
+_NOISE = re.compile(r'[\s\W_]+')
+_PREFIXES = ('หางหนสวนจำกด', 'บรษท', 'หจก')
+_SUFFIXES = ('มหาชน', 'จำกด', 'coltd', 'ltd', 'company', 'limited', 'co')
+
+
+def normalize_text(text):
+    """Fold OCR damage: sara am split/reordered, marks reordered, spacing, company affixes."""
+    s = _SARA_AM.sub('ำ', (text or '').lower())
+    s = _THAI_MARKS.sub('', s)
+    s = _NOISE.sub('', s)
+    changed = True
+    while changed:
+        changed = False
+        for p in _PREFIXES:
+            if s.startswith(p) and len(s) > len(p):
+                s = s[len(p):]
+                changed = True
+        for p in _SUFFIXES:
+            if s.endswith(p) and len(s) > len(p):
+                s = s[:-len(p)]
+                changed = True
+    return s
+
+
+def normalize_phone(text):
+    return re.sub(r'\D', '', text or '')
+
+
+def normalize_code(code):
+    """111A2 and 1A2 are the same code extracted twice; collapse repeated leading digits."""
+    code = (code or '').strip().upper()
+    return re.sub(r'^(\d)\1+', r'\1', code)
+
+
+def shingles(text, k):
+    if not text:
+        return []
+    if len(text) <= k:
+        return [text]
+    return [text[i:i + k] for i in range(len(text) - k + 1)]
+
+
+def _hash_shingles(items):
+    return np.fromiter((zlib.crc32(s.encode('utf-8')) for s in set(items)), dtype=np.uint64)
+
+
+def minhash(shingle_sets, num_perm=NUM_PERM, seed=1, block=BLOCK):
+    """MinHash signatures (n x num_perm, uint64) for a list of shingle lists.
+
+    Empty sets get an all-max signature, which never collides in LSH.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+    empty = np.iinfo(np.uint64).max
+    sig = np.full((len(shingle_sets), num_perm), empty, dtype=np.uint64)
+    for start in range(0, len(shingle_sets), block):
+        hashed = [_hash_shingles(s) for s in shingle_sets[start:start + block]]
+        lengths = np.array([len(h) for h in hashed])
+        rows = np.nonzero(lengths)[0]
+        if not len(rows):
+            continue
+        flat = np.concatenate([hashed[i] for i in rows])
+        offsets = np.concatenate(([0], np.cumsum(lengths[rows])[:-1]))
+        values = (flat[:, None] * a[None, :] + b[None, :]) % _PRIME
+        sig[start + rows] = np.minimum.reduceat(values, offsets, axis=0)
+    return sig
+
+
+def lsh_pairs(sig, bands=BANDS, max_bucket=MAX_BUCKET):
+    """Candidate pairs (i < j) that share at least one LSH band."""
+    n, num_perm = sig.shape
+    rows = num_perm // bands
+    empty = np.all(sig == np.iinfo(np.uint64).max, axis=1)
+    mix = np.random.default_rng(7).integers(1, 2 ** 63, size=rows, dtype=np.uint64)
+    pairs = set()
+    for band in range(bands):
+        keys = (sig[:, band * rows:(band + 1) * rows] * mix).sum(axis=1)  # wraps mod 2**64
+        keys[empty] = np.arange(np.count_nonzero(empty), dtype=np.uint64) ^ np.uint64(0xDEADBEEF)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        starts = np.nonzero(np.diff(sorted_keys))[0] + 1
+        for group in np.split(order, starts):
+            if 1 < len(group) <= max_bucket:
+                g = np.sort(group)
+                for x in range(len(g)):
+                    for y in range(x + 1, len(g)):
+                        pairs.add((int(g[x]), int(g[y])))
+    return pairs
+
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, x, y):
+        rx, ry = self.find(x), self.find(y)
+        if rx != ry:
+            self.parent[max(rx, ry)] = min(rx, ry)
+
+
+def load_suppliers(conn):
+    cur = conn.execute(
+        'SELECT supplier_id, supplier_code, name, address, phone, is_approved, created_at FROM suppliers '
+        'WHERE is_active = 1'
+    )
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+
+def _reference_counts(conn):
+    counts = {}
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table in REFERENCES:
+        if table not in tables:
+            continue
+        for supplier_id, n in conn.execute(
+            f'SELECT supplier_id, count(*) FROM {table} WHERE supplier_id IS NOT NULL GROUP BY supplier_id'
+        ):
+            counts[supplier_id] = counts.get(supplier_id, 0) + n
+    return counts
+
+
+def find_clusters(suppliers, threshold=THRESHOLD):
+    """Clusters of near-duplicate supplier indexes with their pair scores."""
+    n = len(suppliers)
+    if n < 2:
+        return []
+    names = [normalize_text(s['name']) for s in suppliers]
+    sigs = {
+        'name': minhash([shingles(t, SHINGLE) for t in names]),
+        'address': minhash([shingles(normalize_text(s['address']), SHINGLE) for s in suppliers]),
+        'phone': minhash([shingles(normalize_phone(s['phone']), PHONE_SHINGLE) for s in suppliers]),
+    }
+    codes = [normalize_code(s['supplier_code']) for s in suppliers]
+
+    candidates = lsh_pairs(sigs['name']) | lsh_pairs(sigs['phone'])
+    by_code = {}
+    for i, code in enumerate(codes):
+        if code:
+            by_code.setdefault(code, []).append(i)
+    for group in by_code.values():
+        for x in range(len(group)):
+            for y in range(x + 1, len(group)):
+                candidates.add((group[x], group[y]))
+    if not candidates:
+        return []
+
+    pairs = np.array(sorted(candidates), dtype=np.int64)
+    left, right = pairs[:, 0], pairs[:, 1]
+    empty = np.iinfo(np.uint64).max
+    total = np.zeros(len(pairs))
+    weight = np.zeros(len(pairs))
+    sims = {}
+    for field, sig in sigs.items():
+        sim = np.mean(sig[left] == sig[right], axis=1)
+        present = (sig[left, 0] != empty) & (sig[right, 0] != empty)
+        sims[field] = np.where(present, sim, 0.0)
+        total += np.where(present, sim * WEIGHTS[field], 0.0)
+        weight += np.where(present, WEIGHTS[field], 0.0)
+    score = np.divide(total, weight, out=np.zeros_like(total), where=weight > 0)
+    code_match = np.array([codes[i] == codes[j] and bool(codes[i]) for i, j in pairs])
+    score = np.minimum(1.0, score + CODE_BONUS * code_match)
+    keep = (score >= threshold) & (sims['name'] >= NAME_FLOOR)
+
+    uf = _UnionFind(n)
+    pair_scores = {}
+    for (i, j), s in zip(pairs[keep].tolist(), score[keep].tolist()):
+        uf.union(i, j)
+        pair_scores[(i, j)] = s
+    # One pass: members and weakest linking score per root.
+    groups, weakest = {}, {}
+    for (i, j), s in pair_scores.items():
+        root = uf.find(i)
+        groups.setdefault(root, set()).update((i, j))
+        weakest[root] = min(s, weakest.get(root, s))
+    return [(sorted(members), weakest[root]) for root, members in groups.items()]
+
+
+def build_plan(conn, threshold=THRESHOLD):
+    suppliers = load_suppliers(conn)
+    refs = _reference_counts(conn)
+    clusters = find_clusters(suppliers, threshold)
+    plan = []
+    for members, score in clusters:
+        rows = [suppliers[i] for i in members]
+        rows.sort(key=lambda s: (
+            -refs.get(s['supplier_id'], 0), -(s['is_approved'] or 0), s['created_at'] or '', s['supplier_code']
+        ))
+        keep, dupes = rows[0], rows[1:]
+        plan.append({
+            'keep': {'supplier_id': keep['supplier_id'], 'code': keep['supplier_code'], 'name': keep['name']},
+            'merge': [
+                {'supplier_id': d['supplier_id'], 'code': d['supplier_code'], 'name': d['name'],
+                 'references': refs.get(d['supplier_id'], 0)}
+                for d in dupes
+            ],
+            'min_score': round(score, 3),
+        })
+    plan.sort(key=lambda c: c['min_score'])
+    return plan, len(suppliers)
+
+
+def apply_plan(conn, plan):
+    """Repoint references in bulk through a temp mapping table and deactivate duplicates."""
+    mapping = [(d['supplier_id'], c['keep']['supplier_id']) for c in plan for d in c['merge']]
+    if not mapping:
+        return 0
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    with conn:
+        conn.execute('DROP TABLE IF EXISTS temp.supplier_merge')
+        conn.execute('CREATE TEMP TABLE supplier_merge (old_id TEXT PRIMARY KEY, new_id TEXT NOT NULL)')
+        conn.executemany('INSERT OR REPLACE INTO supplier_merge VALUES (?, ?)', mapping)
+        for table in REFERENCES:
+            if table not in tables:
+                continue
+            cur = conn.execute(f'''
+                UPDATE {table}
+                SET supplier_id = (SELECT new_id FROM supplier_merge WHERE old_id = {table}.supplier_id)
+                WHERE supplier_id IN (SELECT old_id FROM supplier_merge)
+            ''')
+            print(f"  {table}: repointed {cur.rowcount} rows")
+        conn.execute('''
+            UPDATE suppliers SET is_active = 0
+            WHERE supplier_id IN (SELECT old_id FROM supplier_merge)
+        ''')
+        conn.execute('DROP TABLE temp.supplier_merge')
+    return len(mapping)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find and merge near-duplicate suppliers.')
+    parser.add_argument('--db', default=db_path)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('find', help='write a merge plan for review')
+    p.add_argument('--threshold', type=float, default=THRESHOLD)
+    p.add_argument('--out', default='supplier_merge.json')
+    p = sub.add_parser('apply', help='apply a reviewed merge plan')
+    p.add_argument('plan')
+    args = parser.parse_args(argv)
+
+    with Session(args.db) as session:
+        if args.command == 'find':
+            started = time.perf_counter()
+            plan, total = build_plan(session.conn, args.threshold)
+            with open(args.out, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+                    'threshold': args.threshold,
+                    'clusters': plan,
+                }, f, ensure_ascii=False, indent=1)
+            dupes = sum(len(c['merge']) for c in plan)
+            print(
+                f"Scanned {total} suppliers in {time.perf_counter() - started:.2f}s: "
+                f"{len(plan)} clusters, {dupes} duplicates. Plan written to {args.out}."
+            )
+        else:
+            with open(args.plan, encoding='utf-8') as f:
+                plan = json.load(f)['clusters']
+            merged = apply_plan(session.conn, plan)
+            print(f"Merged {merged} duplicate suppliers into {len(plan)} survivors.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scripts import each other as top-level modules (``from session import ...``).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,54 @@
+import datetime
+import sqlite3
+
+import pytest
+
+import dispatch
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.executescript('''
+        CREATE TABLE users (user_id TEXT PRIMARY KEY, full_name TEXT, role TEXT, dept_id TEXT, is_active INTEGER);
+        CREATE TABLE technician_availability (avail_id TEXT PRIMARY KEY, technician_id TEXT, available_date TEXT,
+                                              available_hours REAL, reserved_hours REAL,
+                                              UNIQUE (technician_id, available_date));
+        CREATE TABLE technician_skills (skill_id TEXT PRIMARY KEY, technician_id TEXT, skill_name TEXT,
+                                        proficiency_level TEXT, certified INTEGER);
+        CREATE TABLE work_orders (wo_id TEXT PRIMARY KEY, wo_no TEXT, machine_id TEXT, status TEXT, priority TEXT,
+                                  title TEXT, description TEXT, failure_symptom TEXT, estimated_hours REAL,
+                                  assigned_to TEXT, created_at TEXT, updated_at TEXT);
+        INSERT INTO users VALUES ('T1', 'Somchai', 'technician', 'D1', 1), ('T2', 'Anan', 'technician', 'D1', 1);
+        -- Status values as the app stores them (work_order_provider.dart startWorkOrder).
+        INSERT INTO work_orders (wo_id, wo_no, machine_id, status, assigned_to, created_at) VALUES
+            ('W1', 'WO-2026-00001', 'M1', 'in_progress', 'T1', '2026-10-19T08:00:00'),
+            ('W2', 'WO-2026-00002', 'M2', 'completed', 'T2', '2026-10-18T08:00:00'),
+            ('W3', 'WO-2026-00003', 'M3', 'pending', NULL, '2026-10-19T09:00:00');
+    ''')
+    yield conn
+    conn.close()
+
+
+MACHINES = {
+    'M1': {'machine_id': 'M1', 'location': 'Line A', 'dept_id': 'D1'},
+    'M2': {'machine_id': 'M2', 'location': 'Line B', 'dept_id': 'D1'},
+    'M3': {'machine_id': 'M3', 'location': 'Line A', 'dept_id': 'D1'},
+}
+
+
+def test_in_progress_work_orders_set_technician_machines(conn):
+    techs = {t['user_id']: t for t in dispatch.load_technicians(conn, '2026-10-19')}
+    assert techs['T1']['machines'] == {'M1'}
+    assert techs['T2']['machines'] == set()
+
+
+def test_technician_at_same_location_is_cheapest(conn):
+    techs = dispatch.load_technicians(conn, '2026-10-19')
+    wos = dispatch.load_work_orders(conn)
+    assert [wo['wo_id'] for wo in wos] == ['W3']
+    cost, _ = dispatch.cost_matrix(techs, wos, MACHINES.get, datetime.datetime(2026, 10, 19, 12))
+    by_tech = {t['user_id']: cost[i, 0] for i, t in enumerate(techs)}
+    # T1 is working on M1, at the same location as M3; T2 only shares the department.
+    assert by_tech['T1'] < by_tech['T2']
+    assert by_tech['T2'] - by_tech['T1'] == pytest.approx(dispatch.WEIGHTS['location'] * 0.5)